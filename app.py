@@ -2,12 +2,21 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime
 import numpy as np
-from utils import load_and_process_data, get_orders_summary, get_ads_summary, filter_dataframe
+from utils import (load_snapshot, get_data_version, get_orders_summary, get_ads_summary, get_ads_kpis, filter_dataframe,
+                   rollup_cube, get_cube_summary, build_filter_index, filter_rows,
+                   build_search_index, search_rows, build_sort_index, sorted_page, build_orders_table,
+                   count_orders, count_orders_by, sum_orders_by, summarize_orders, ORDER_FILTER_COLUMNS,
+                   build_orders_sketches, estimate_orders, DISTINCT_MODE,
+                   build_weekday_hour_matrix, weekday_hour_totals, build_ads_daily, attribute_sales, get_attribution_roi,
+                   shared_result, DataRefresher, REFRESH_INTERVAL)
 import base64
 import calendar
 import locale
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 # Definir o locale para português brasileiro
 try:
@@ -271,20 +280,174 @@ def banner_header():
     """, unsafe_allow_html=True)
 
 # Load and process data
-@st.cache_data
-def get_data():
-    return load_and_process_data()
+# A versão dos dados muda quando um arquivo é adicionado ou alterado,
+# invalidando o cache automaticamente. Os resultados marcados com
+# shared_result também passam pelo cache compartilhado entre os workers
+# (DASHBOARD_SHARED_CACHE), de modo que só o primeiro worker os calcula.
+# Sem atualização em segundo plano, o snapshot (dados, cubo de agregados e
+# a versão correspondente) é carregado sob o mesmo lock da atualização e só
+# a versão atual fica em memória
+@st.cache_resource(max_entries=1)
+def get_snapshot(data_version):
+    return load_snapshot()
 
-df_ads, df_orders = get_data()
+# Caches por versão dos dados guardam a versão atual e a anterior (sessões
+# abertas durante uma atualização); versões mais antigas são descartadas
+DATA_CACHE_ENTRIES = 2
+
+# Índice de filtros (bitmap por valor de tipo, status, estado e categoria).
+# Compartilhado sem cópia entre as sessões, pois é somente leitura
+@st.cache_resource(max_entries=DATA_CACHE_ENTRIES)
+def get_filter_index(data_version, _df_orders):
+    return build_filter_index(_df_orders)
+
+# Índice de busca por palavra-chave nos nomes de produtos (sem acentos)
+@st.cache_resource(max_entries=DATA_CACHE_ENTRIES)
+def get_search_index(data_version, _df_orders):
+    return build_search_index(_df_orders['produto_nome'])
+
+# Ordem da tabela de pedidos (mais recentes primeiro), calculada uma vez
+@st.cache_resource(max_entries=DATA_CACHE_ENTRIES)
+def get_sort_index(data_version, _df_orders):
+    return build_sort_index(_df_orders, 'pedido_data', ascending=False)
+
+# Tabela de cabeçalhos de pedidos (uma linha por pedido, com data/hora,
+# status, estado, total e itens), ligada às linhas por um código inteiro;
+# contagens e métricas por pedido usam esta tabela. No modo 'hll', sketches
+# HyperLogLog por combinação de filtros
+@st.cache_resource(max_entries=DATA_CACHE_ENTRIES)
+def get_orders_table(data_version, _df_orders):
+    return build_orders_table(_df_orders)
+
+@st.cache_resource(max_entries=DATA_CACHE_ENTRIES)
+def get_orders_sketches(data_version, _df_orders):
+    return build_orders_sketches(_df_orders)
+
+# Vendas por dia da semana x hora (7 x 24), no total e por categoria
+@st.cache_data(max_entries=DATA_CACHE_ENTRIES)
+def get_weekday_hour_matrix(data_version, _df_orders):
+    return shared_result('weekday_hour', data_version, (),
+                         lambda: build_weekday_hour_matrix(_df_orders, 'categoria_produto'))
+
+# Atribuição das vendas diárias às campanhas ativas em cada dia (mesmo tipo
+# de venda, proporcional ao gasto do dia)
+@st.cache_data(max_entries=DATA_CACHE_ENTRIES)
+def get_attribution(data_version, _orders_cube, _df_ads):
+    def build():
+        daily_sales = rollup_cube(_orders_cube, ['pedido_data', 'tipo_venda'])
+        return attribute_sales(daily_sales, build_ads_daily(_df_ads))
+    return shared_result('attribution', data_version, (), build)
+
+# Figuras memorizadas por versão dos dados, gráfico e parâmetros (categoria,
+# filtros da tabela); acima do limite as menos usadas são descartadas (LRU).
+# O cache guarda a especificação serializada (fig.to_json()) e cada rerun
+# reconstrói a sua figura, sem compartilhar objetos mutáveis entre sessões.
+# _build só é chamado quando a figura não está no cache
+FIGURE_CACHE_SIZE = int(os.environ.get('DASHBOARD_FIGURE_CACHE', '256'))
+
+@st.cache_data(max_entries=FIGURE_CACHE_SIZE)
+def cached_figure_spec(data_version, chart, params, _build):
+    return shared_result('figure', data_version, (chart, params), lambda: _build().to_json())
+
+def cached_figure(data_version, chart, params, build):
+    return pio.from_json(cached_figure_spec(data_version, chart, params, build))
+
+# Atualização em segundo plano: uma thread por processo recarrega os dados
+# quando as exportações mudam e troca o snapshot de uma só vez; as sessões
+# nunca esperam pela carga nem veem dados pela metade
+@st.cache_resource
+def get_refresher():
+    return DataRefresher(interval=REFRESH_INTERVAL)
+
+# Cálculos independentes de cada aba executados em paralelo num pool de
+# threads limitado, já que pandas e NumPy liberam o GIL; as chamadas do
+# Streamlit continuam na ordem do script. As agregações sem filtros rodam uma
+# vez por versão dos dados (get_tab_aggregates), o que depende dos filtros
+# roda a cada rerun. DASHBOARD_CHART_WORKERS=1 executa os cálculos em série
+CHART_WORKERS = int(os.environ.get('DASHBOARD_CHART_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+@st.cache_resource
+def get_chart_pool(workers):
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dashboard-chart')
+
+def run_chart_jobs(jobs):
+    """
+    Run the computations a tab declares (name -> function without Streamlit
+    calls) and return name -> result
+    """
+    if CHART_WORKERS <= 1 or len(jobs) <= 1:
+        return {name: job() for name, job in jobs.items()}
+    pool = get_chart_pool(CHART_WORKERS)
+    futures = {name: pool.submit(job) for name, job in jobs.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+# Agregações de cada aba, memorizadas por versão dos dados (uma entrada por
+# aba e versão); _jobs só é executado quando a aba não está no cache
+@st.cache_data(max_entries=3 * DATA_CACHE_ENTRIES)
+def get_tab_aggregates(data_version, tab, _jobs):
+    return run_chart_jobs(_jobs)
+
+# Linhas por página na tabela de pedidos
+PAGE_SIZE_OPTIONS = [25, 50, 100, 250]
+
+if REFRESH_INTERVAL > 0:
+    # O snapshot é lido uma vez por rerun, todo o script usa a mesma versão
+    snapshot = get_refresher().snapshot
+else:
+    snapshot = get_snapshot(get_data_version())
+data_version = snapshot['data_version']
+df_ads, df_orders, orders_cube = snapshot['df_ads'], snapshot['df_orders'], snapshot['orders_cube']
+orders_index = get_filter_index(data_version, df_orders)
+orders_search_index = get_search_index(data_version, df_orders)
+orders_sort_index = get_sort_index(data_version, df_orders)
+orders_table = get_orders_table(data_version, df_orders)
+
+# Resumos de pedidos e campanhas por tipo de venda (None = todos),
+# memorizados por versão dos dados (três entradas por versão: todos,
+# Instituto e Ecommerce)
+@st.cache_data(max_entries=3 * DATA_CACHE_ENTRIES)
+def get_summaries(data_version, tipo_venda, _orders_cube, _df_ads):
+    def build():
+        orders_summary = get_cube_summary(_orders_cube, tipo_venda)
+        ads = _df_ads if tipo_venda is None else filter_dataframe(_df_ads, 'tipo_campanha', tipo_venda)
+        # ROI e ROAS medidos contra as vendas do mesmo tipo
+        return orders_summary, get_ads_summary(ads, orders_summary['total_vendas'])
+    return shared_result('summaries', data_version, (tipo_venda,), build)
+
+# Modo de abas sob demanda: apenas a aba selecionada calcula seus gráficos.
+# Use DASHBOARD_LAZY_TABS=0 para voltar às abas tradicionais (todas calculadas)
+LAZY_TABS = os.environ.get('DASHBOARD_LAZY_TABS', '1') != '0'
+TAB_NAMES = ["Geral", "Instituto", "Ecommerce", "Tabela de Pedidos"]
+
+# O Streamlit descarta o estado dos widgets que não são exibidos num rerun
+# (as seções ocultas no modo sob demanda). Os valores dos widgets com chave
+# ficam guardados à parte e são restaurados quando a seção volta a aparecer
+def widget_key(key, default, options=None):
+    """
+    Session State key of a widget, initialised with the value it had when
+    last shown (or default, also when that value is no longer an option)
+    """
+    saved = st.session_state.setdefault('widgets_salvos', {})
+    if key not in st.session_state:
+        value = saved.get(key, default)
+        st.session_state[key] = value if options is None or value in options else default
+    saved.setdefault(key, default)
+    return key
+
+def save_widget_state():
+    """
+    Keep the current value of every widget created with widget_key
+    """
+    saved = st.session_state.get('widgets_salvos', {})
+    for key in saved:
+        if key in st.session_state:
+            saved[key] = st.session_state[key]
 
 # Header with styled banner
 banner_header()
 
-# Create tabs for different sections
-tab1, tab2, tab3, tab4 = st.tabs(["Geral", "Instituto", "Ecommerce", "Tabela de Pedidos"])
-
 # ---------- GENERAL TAB ----------
-with tab1:
+def render_geral():
     st.markdown("""
     <div class="tab-header">
         <h2>Visão Geral</h2>
@@ -293,12 +456,28 @@ with tab1:
     """, unsafe_allow_html=True)
     
     # Summary metrics
-    orders_summary = get_orders_summary(df_orders)
-    ads_summary = get_ads_summary(df_ads)
+    orders_summary, ads_summary = get_summaries(data_version, None, orders_cube, df_ads)
+    atribuicao = get_attribution(data_version, orders_cube, df_ads)
+    # Matriz dia da semana x hora: o mapa de calor e, pelas somas das linhas
+    # e colunas, as vendas por dia da semana e por hora
+    matriz_vendas = get_weekday_hour_matrix(data_version, df_orders)
+    
+    # Agregações da aba, calculadas em paralelo uma vez por versão dos dados
+    agregados = get_tab_aggregates(data_version, 'Geral', {
+        'vendas_por_tipo': lambda: rollup_cube(orders_cube, 'tipo_venda'),
+        'vendas_diarias': lambda: rollup_cube(orders_cube, 'pedido_data'),
+        'vendas_por_dia_semana': lambda: weekday_hour_totals(matriz_vendas, 'dia_semana'),
+        'vendas_por_hora': lambda: weekday_hour_totals(matriz_vendas, 'hora'),
+        'vendas_por_estado': lambda: rollup_cube(orders_cube, 'envio_estado'),
+        'campanhas_por_tipo': lambda: get_ads_kpis(df_ads, 'tipo_campanha'),
+        'campanhas_por_canal': lambda: get_ads_kpis(df_ads, ['canal', 'responsavel']),
+        'roi_por_dia': lambda: get_attribution_roi(atribuicao, 'data'),
+        'roi_por_campanha': lambda: get_attribution_roi(atribuicao, 'nome_campanha')
+    })
     
     # Calcular métricas importantes
-    roi = ((orders_summary['total_vendas'] - ads_summary['total_gasto']) / ads_summary['total_gasto']) * 100
-    cpa = ads_summary['total_gasto'] / ads_summary['total_conversoes'] if ads_summary['total_conversoes'] > 0 else 0
+    roi = ads_summary['roi']
+    cpa = ads_summary['cpa']
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -340,12 +519,7 @@ with tab1:
     col1, col2 = st.columns(2)
     
     with col1:
-        instituto_orders = filter_dataframe(df_orders, 'tipo_venda', 'Instituto')
-        ecommerce_orders = filter_dataframe(df_orders, 'tipo_venda', 'Ecommerce')
-        instituto_total = instituto_orders['produto_valor_total'].sum()
-        ecommerce_total = ecommerce_orders['produto_valor_total'].sum()
-        
-        vendas_por_tipo = df_orders.groupby('tipo_venda')['produto_valor_total'].sum().reset_index()
+        vendas_por_tipo = agregados['vendas_por_tipo']
         vendas_por_tipo.columns = ['Tipo', 'Valor Total']
         
         # Tipo que teve maior venda
@@ -391,8 +565,8 @@ with tab1:
     
     # Análise por Dia
     st.subheader("Análise por Dia")
-    dia_mais_vendas = df_orders.groupby('pedido_data')['produto_valor_total'].sum().idxmax()
-    vendas_dia = df_orders.groupby('pedido_data')['produto_valor_total'].sum().max()
+    vendas_diarias = agregados['vendas_diarias']
+    dia_mais_vendas, vendas_dia = vendas_diarias.loc[vendas_diarias['produto_valor_total'].idxmax()]
     dia_formatado = dia_mais_vendas.strftime('%d/%m/%Y')
     
     col1, col2 = st.columns(2)
@@ -421,20 +595,23 @@ with tab1:
             'Valor': [orders_summary['total_vendas'], ads_summary['total_gasto']]
         })
         
-        fig = px.bar(
-            roi_data, 
-            x='Categoria', 
-            y='Valor',
-            text_auto='.2s',
-            title="Receita vs. Investimento",
-            color='Categoria',
-            color_discrete_sequence=['#4CAF50', '#2196F3']
-        )
-        fig.update_layout(
-            xaxis_title="",
-            yaxis_title="Valor (R$)",
-            yaxis_tickprefix="R$ "
-        )
+        def build_figure():
+            fig = px.bar(
+                roi_data, 
+                x='Categoria', 
+                y='Valor',
+                text_auto='.2s',
+                title="Receita vs. Investimento",
+                color='Categoria',
+                color_discrete_sequence=['#4CAF50', '#2196F3']
+            )
+            fig.update_layout(
+                xaxis_title="",
+                yaxis_title="Valor (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "Receita vs. Investimento", None, build_figure)
         
         chart_with_explanation(
             fig,
@@ -445,14 +622,17 @@ with tab1:
     
     with col2:
         # Group by tipo_venda
-        fig = px.pie(
-            vendas_por_tipo,
-            values='Valor Total',
-            names='Tipo',
-            title="Distribuição de Vendas",
-            color_discrete_sequence=px.colors.qualitative.Plotly
-        )
-        fig.update_traces(textposition='inside', textinfo='percent+label')
+        def build_figure():
+            fig = px.pie(
+                vendas_por_tipo,
+                values='Valor Total',
+                names='Tipo',
+                title="Distribuição de Vendas",
+                color_discrete_sequence=px.colors.qualitative.Plotly
+            )
+            fig.update_traces(textposition='inside', textinfo='percent+label')
+            return fig
+        fig = cached_figure(data_version, "Distribuição de Vendas", None, build_figure)
         
         chart_with_explanation(
             fig,
@@ -466,22 +646,22 @@ with tab1:
     # Sales over time
     st.subheader("Vendas ao Longo do Mês")
     
-    # Group by date
-    vendas_diarias = df_orders.groupby('pedido_data')['produto_valor_total'].sum().reset_index()
-    
-    fig = px.line(
-        vendas_diarias,
-        x='pedido_data',
-        y='produto_valor_total',
-        markers=True,
-        title="Vendas Diárias em Abril 2025",
-        labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
-    )
-    fig.update_layout(
-        xaxis_title="Data",
-        yaxis_title="Valor (R$)",
-        yaxis_tickprefix="R$ "
-    )
+    def build_figure():
+        fig = px.line(
+            vendas_diarias,
+            x='pedido_data',
+            y='produto_valor_total',
+            markers=True,
+            title="Vendas Diárias em Abril 2025",
+            labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
+        )
+        fig.update_layout(
+            xaxis_title="Data",
+            yaxis_title="Valor (R$)",
+            yaxis_tickprefix="R$ "
+        )
+        return fig
+    fig = cached_figure(data_version, "Vendas Diárias em Abril 2025", None, build_figure)
     st.plotly_chart(fig, use_container_width=True)
     
     st.divider()
@@ -489,48 +669,40 @@ with tab1:
     # Análise de vendas por dia da semana e hora
     st.subheader("Padrões de Vendas por Dia da Semana e Hora")
     
-    # Adicionar dias da semana e extrair hora
-    df_orders_temporal = df_orders.copy()
-    df_orders_temporal['dia_da_semana'] = df_orders_temporal['pedido_data'].dt.day_name()
-    df_orders_temporal['hora'] = df_orders_temporal['pedido_hora'].str.split(':').str[0].astype(int)
-    
-    # Definir ordem dos dias da semana
-    dias_semana_ordem = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    # Hora e dia da semana já vêm calculados no carregamento (0 = segunda)
     dias_semana_pt = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-    mapa_dias = dict(zip(dias_semana_ordem, dias_semana_pt))
-    df_orders_temporal['dia_da_semana_pt'] = df_orders_temporal['dia_da_semana'].map(mapa_dias)
     
     col1, col2 = st.columns(2)
     
     with col1:
         # Vendas por dia da semana
-        vendas_por_dia_semana = df_orders_temporal.groupby('dia_da_semana_pt')['produto_valor_total'].sum().reset_index()
-        # Reordenar para ordem dos dias da semana
-        ordem_dias_pt = [mapa_dias[dia] for dia in dias_semana_ordem]
-        vendas_por_dia_semana['dia_da_semana_pt'] = pd.Categorical(
-            vendas_por_dia_semana['dia_da_semana_pt'], 
-            categories=ordem_dias_pt, 
+        vendas_por_dia_semana = agregados['vendas_por_dia_semana']
+        vendas_por_dia_semana['dia_da_semana_pt'] = pd.Categorical.from_codes(
+            vendas_por_dia_semana['dia_semana'], 
+            categories=dias_semana_pt, 
             ordered=True
         )
-        vendas_por_dia_semana = vendas_por_dia_semana.sort_values('dia_da_semana_pt')
         
         # Encontrar dia da semana com maior venda
         dia_maior_vendas = vendas_por_dia_semana.iloc[vendas_por_dia_semana['produto_valor_total'].argmax()]
         
-        fig = px.bar(
-            vendas_por_dia_semana,
-            x='dia_da_semana_pt',
-            y='produto_valor_total',
-            text_auto='.2s',
-            title="Vendas por Dia da Semana",
-            color='produto_valor_total',
-            color_continuous_scale='Viridis'
-        )
-        fig.update_layout(
-            xaxis_title="Dia da Semana",
-            yaxis_title="Valor Total (R$)",
-            yaxis_tickprefix="R$ "
-        )
+        def build_figure():
+            fig = px.bar(
+                vendas_por_dia_semana,
+                x='dia_da_semana_pt',
+                y='produto_valor_total',
+                text_auto='.2s',
+                title="Vendas por Dia da Semana",
+                color='produto_valor_total',
+                color_continuous_scale='Viridis'
+            )
+            fig.update_layout(
+                xaxis_title="Dia da Semana",
+                yaxis_title="Valor Total (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "Vendas por Dia da Semana", None, build_figure)
         
         # Exibir gráfico com explicação
         st.plotly_chart(fig, use_container_width=True)
@@ -552,7 +724,7 @@ with tab1:
     
     with col2:
         # Vendas por hora do dia
-        vendas_por_hora = df_orders_temporal.groupby('hora')['produto_valor_total'].sum().reset_index()
+        vendas_por_hora = agregados['vendas_por_hora']
         
         # Encontrar hora com maior venda
         hora_maior_vendas = vendas_por_hora.iloc[vendas_por_hora['produto_valor_total'].argmax()]
@@ -560,23 +732,26 @@ with tab1:
         # Formatar para exibir horário comercial
         vendas_por_hora['hora_formatada'] = vendas_por_hora['hora'].apply(lambda x: f"{x}:00")
         
-        fig = px.line(
-            vendas_por_hora,
-            x='hora',
-            y='produto_valor_total',
-            markers=True,
-            title="Vendas por Hora do Dia",
-            labels={'hora': 'Hora do dia', 'produto_valor_total': 'Valor Total (R$)'}
-        )
-        fig.update_layout(
-            xaxis_title="Hora do Dia",
-            yaxis_title="Valor (R$)",
-            yaxis_tickprefix="R$ ",
-            xaxis_tickmode='linear',
-            xaxis_tick0=0,
-            xaxis_dtick=2,  # Mais espaçado para melhor visualização mobile
-            height=350  # Altura fixa para melhor aspecto
-        )
+        def build_figure():
+            fig = px.line(
+                vendas_por_hora,
+                x='hora',
+                y='produto_valor_total',
+                markers=True,
+                title="Vendas por Hora do Dia",
+                labels={'hora': 'Hora do dia', 'produto_valor_total': 'Valor Total (R$)'}
+            )
+            fig.update_layout(
+                xaxis_title="Hora do Dia",
+                yaxis_title="Valor (R$)",
+                yaxis_tickprefix="R$ ",
+                xaxis_tickmode='linear',
+                xaxis_tick0=0,
+                xaxis_dtick=2,  # Mais espaçado para melhor visualização mobile
+                height=350  # Altura fixa para melhor aspecto
+            )
+            return fig
+        fig = cached_figure(data_version, "Vendas por Hora do Dia", None, build_figure)
         
         # Exibir gráfico
         st.plotly_chart(fig, use_container_width=True)
@@ -598,11 +773,41 @@ with tab1:
         </div>
         """, unsafe_allow_html=True)
     
+    # Mapa de calor dia da semana x hora, a partir da matriz pré-calculada
+    opcoes_mapa = ['Todas'] + matriz_vendas['groups']
+    categoria_mapa = st.selectbox('Categoria do mapa de calor', opcoes_mapa,
+                                  key=widget_key('categoria_mapa', 'Todas', opcoes_mapa),
+                                  help="Restringe o mapa de calor a uma categoria de produto")
+    if categoria_mapa == 'Todas':
+        valores_mapa = matriz_vendas['total']
+    else:
+        valores_mapa = matriz_vendas['by_group'][matriz_vendas['groups'].index(categoria_mapa)]
+    
+    def build_figure():
+        fig = px.imshow(
+            valores_mapa,
+            x=list(range(24)),
+            y=dias_semana_pt,
+            labels={'x': 'Hora do dia', 'y': 'Dia da semana', 'color': 'Valor Total (R$)'},
+            title="Vendas por Dia da Semana e Hora",
+            color_continuous_scale='Viridis',
+            aspect='auto'
+        )
+        fig.update_layout(
+            xaxis_tickmode='linear',
+            xaxis_tick0=0,
+            xaxis_dtick=2,
+            height=350
+        )
+        return fig
+    fig = cached_figure(data_version, "Vendas por Dia da Semana e Hora", categoria_mapa, build_figure)
+    st.plotly_chart(fig, use_container_width=True)
+    
     # Geographic distribution
     st.subheader("Distribuição Geográfica das Vendas")
     
     # Group by state
-    vendas_por_estado = df_orders.groupby('envio_estado')['produto_valor_total'].sum().reset_index()
+    vendas_por_estado = agregados['vendas_por_estado']
     vendas_por_estado.columns = ['Estado', 'Valor Total']
     vendas_por_estado = vendas_por_estado.sort_values('Valor Total', ascending=False)
     
@@ -611,21 +816,24 @@ with tab1:
     estados_destaque = ", ".join([f"{estado}" for estado in top3_estados['Estado'].values])
     percentual_top3 = (top3_estados['Valor Total'].sum() / vendas_por_estado['Valor Total'].sum()) * 100
     
-    fig = px.bar(
-        vendas_por_estado,
-        x='Estado',
-        y='Valor Total',
-        text_auto='.2s',
-        title="Vendas por Estado",
-        color='Valor Total',
-        color_continuous_scale='Viridis'
-    )
-    fig.update_layout(
-        xaxis_title="Estado",
-        yaxis_title="Valor (R$)",
-        yaxis_tickprefix="R$ ",
-        height=400  # Altura fixa para melhor visualização
-    )
+    def build_figure():
+        fig = px.bar(
+            vendas_por_estado,
+            x='Estado',
+            y='Valor Total',
+            text_auto='.2s',
+            title="Vendas por Estado",
+            color='Valor Total',
+            color_continuous_scale='Viridis'
+        )
+        fig.update_layout(
+            xaxis_title="Estado",
+            yaxis_title="Valor (R$)",
+            yaxis_tickprefix="R$ ",
+            height=400  # Altura fixa para melhor visualização
+        )
+        return fig
+    fig = cached_figure(data_version, "Vendas por Estado", None, build_figure)
     
     # Exibir gráfico com explicação 
     st.plotly_chart(fig, use_container_width=True)
@@ -656,34 +864,28 @@ with tab1:
     col1, col2 = st.columns(2)
     
     with col1:
-        # Group by campaign type
-        campanhas_por_tipo = df_ads.groupby('tipo_campanha').agg({
-            'valor_gasto': 'sum',
-            'cliques': 'sum',
-            'impressoes': 'sum',
-            'adicoes_carrinho': 'sum'  # Mantemos o nome da coluna original do DataFrame
-        }).reset_index()
-        
-        # Calculate CTR and conversion rate
-        campanhas_por_tipo['ctr'] = (campanhas_por_tipo['cliques'] / campanhas_por_tipo['impressoes']) * 100
-        campanhas_por_tipo['taxa_conversao'] = (campanhas_por_tipo['adicoes_carrinho'] / campanhas_por_tipo['cliques']) * 100
+        # Totais e KPIs (CTR, taxa de conversão, CPA...) por tipo de campanha
+        campanhas_por_tipo = agregados['campanhas_por_tipo']
         
         # Encontrar campanha com maior investimento
         campanha_maior_invest = campanhas_por_tipo.iloc[campanhas_por_tipo['valor_gasto'].argmax()]
         
-        fig = px.bar(
-            campanhas_por_tipo,
-            x='tipo_campanha',
-            y='valor_gasto',
-            text_auto='.2s',
-            title="Investimento por Tipo de Campanha",
-            color='tipo_campanha'
-        )
-        fig.update_layout(
-            xaxis_title="Tipo de Campanha",
-            yaxis_title="Valor Gasto (R$)",
-            yaxis_tickprefix="R$ "
-        )
+        def build_figure():
+            fig = px.bar(
+                campanhas_por_tipo,
+                x='tipo_campanha',
+                y='valor_gasto',
+                text_auto='.2s',
+                title="Investimento por Tipo de Campanha",
+                color='tipo_campanha'
+            )
+            fig.update_layout(
+                xaxis_title="Tipo de Campanha",
+                yaxis_title="Valor Gasto (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "Investimento por Tipo de Campanha", None, build_figure)
         
         # Exibir gráfico
         st.plotly_chart(fig, use_container_width=True)
@@ -708,23 +910,26 @@ with tab1:
         # Encontrar campanha com maior taxa de conversão
         campanha_maior_conv = campanhas_por_tipo.iloc[campanhas_por_tipo['taxa_conversao'].argmax()]
         
-        fig = px.bar(
-            campanhas_por_tipo,
-            x='tipo_campanha',
-            y=['ctr', 'taxa_conversao'],
-            barmode='group',
-            title="CTR e Taxa de Conversão por Tipo de Campanha",
-            labels={
-                'value': 'Percentual (%)',
-                'variable': 'Métrica',
-                'tipo_campanha': 'Tipo de Campanha'
-            }
-        )
-        fig.update_layout(
-            xaxis_title="Tipo de Campanha",
-            yaxis_title="Percentual (%)",
-            yaxis_ticksuffix="%"
-        )
+        def build_figure():
+            fig = px.bar(
+                campanhas_por_tipo,
+                x='tipo_campanha',
+                y=['ctr', 'taxa_conversao'],
+                barmode='group',
+                title="CTR e Taxa de Conversão por Tipo de Campanha",
+                labels={
+                    'value': 'Percentual (%)',
+                    'variable': 'Métrica',
+                    'tipo_campanha': 'Tipo de Campanha'
+                }
+            )
+            fig.update_layout(
+                xaxis_title="Tipo de Campanha",
+                yaxis_title="Percentual (%)",
+                yaxis_ticksuffix="%"
+            )
+            return fig
+        fig = cached_figure(data_version, "CTR e Taxa de Conversão por Tipo de Campanha", None, build_figure)
         
         # Exibir gráfico
         st.plotly_chart(fig, use_container_width=True)
@@ -744,9 +949,109 @@ with tab1:
             </div>
         </div>
         """, unsafe_allow_html=True)
+    
+    # Hierarquia das campanhas a partir das tags do nome ([RESPONSÁVEL] [CANAL])
+    campanhas_por_canal = agregados['campanhas_por_canal']
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        def build_figure():
+            fig = px.bar(
+                campanhas_por_canal,
+                x='canal',
+                y='valor_gasto',
+                color='responsavel',
+                text_auto='.2s',
+                title="Investimento por Canal e Responsável",
+                labels={'canal': 'Canal', 'responsavel': 'Responsável', 'valor_gasto': 'Valor Gasto (R$)'}
+            )
+            fig.update_layout(
+                xaxis_title="Canal",
+                yaxis_title="Valor Gasto (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "Investimento por Canal e Responsável", None, build_figure)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        def build_figure():
+            fig = px.bar(
+                campanhas_por_canal,
+                x='canal',
+                y='cpa',
+                color='responsavel',
+                barmode='group',
+                text_auto='.2f',
+                title="CPA por Canal e Responsável",
+                labels={'canal': 'Canal', 'responsavel': 'Responsável', 'cpa': 'CPA (R$)'}
+            )
+            fig.update_layout(
+                xaxis_title="Canal",
+                yaxis_title="Custo por Adição ao Carrinho (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "CPA por Canal e Responsável", None, build_figure)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.divider()
+    
+    # ROI por dia e por campanha, com as vendas atribuídas às campanhas ativas
+    st.subheader("Atribuição de Vendas às Campanhas")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        roi_por_dia = agregados['roi_por_dia']
+        
+        def build_figure():
+            fig = px.line(
+                roi_por_dia,
+                x='data',
+                y='roi',
+                markers=True,
+                title="Atribuição: ROI por Dia",
+                labels={'data': 'Data', 'roi': 'ROI (%)'}
+            )
+            fig.update_layout(
+                xaxis_title="Data",
+                yaxis_title="ROI (%)",
+                yaxis_ticksuffix="%"
+            )
+            return fig
+        fig = cached_figure(data_version, "Atribuição: ROI por Dia", None, build_figure)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        roi_por_campanha = agregados['roi_por_campanha'].sort_values('roi', ascending=False)
+        
+        def build_figure():
+            fig = px.bar(
+                roi_por_campanha,
+                x='nome_campanha',
+                y='roi',
+                text_auto='.0f',
+                title="Atribuição: ROI por Campanha",
+                color='roi',
+                color_continuous_scale='Viridis',
+                labels={'nome_campanha': 'Campanha', 'roi': 'ROI (%)'}
+            )
+            fig.update_layout(
+                xaxis_title="Campanha",
+                yaxis_title="ROI (%)",
+                yaxis_ticksuffix="%"
+            )
+            return fig
+        fig = cached_figure(data_version, "Atribuição: ROI por Campanha", None, build_figure)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.caption("As vendas de cada dia são divididas entre as campanhas do mesmo tipo ativas no dia, "
+               "na proporção do valor gasto por cada uma.")
 
 # ---------- INSTITUTO TAB ----------
-with tab2:
+def render_instituto():
     st.markdown("""
     <div class="tab-header">
         <h2>Instituto - Cursos e Workshops</h2>
@@ -769,20 +1074,20 @@ with tab2:
     )
     
     # Filter data for Instituto
-    instituto_orders = filter_dataframe(df_orders, 'tipo_venda', 'Instituto')
-    instituto_ads = filter_dataframe(df_ads, 'tipo_campanha', 'Instituto')
+    instituto_orders_summary, instituto_ads_summary = get_summaries(data_version, 'Instituto', orders_cube, df_ads)
     
-    instituto_orders_summary = get_orders_summary(instituto_orders)
-    instituto_ads_summary = get_ads_summary(instituto_ads)
+    # Agregações da aba, calculadas em paralelo uma vez por versão dos dados
+    agregados = get_tab_aggregates(data_version, 'Instituto', {
+        'cursos_populares': lambda: rollup_cube(
+            orders_cube, 'produto_nome', ['produto_quantidade', 'produto_valor_total'],
+            tipo_venda='Instituto', categoria_produto='Cursos e Workshops'
+        ),
+        'vendas_diarias': lambda: rollup_cube(orders_cube, 'pedido_data', tipo_venda='Instituto')
+    })
     
-    # Calcular métricas adicionais
-    if instituto_ads_summary['total_gasto'] > 0:
-        roi_instituto = ((instituto_orders_summary['total_vendas'] - instituto_ads_summary['total_gasto']) / 
-                         instituto_ads_summary['total_gasto']) * 100
-        cpa_instituto = instituto_ads_summary['total_gasto'] / instituto_ads_summary['total_conversoes'] if instituto_ads_summary['total_conversoes'] > 0 else 0
-    else:
-        roi_instituto = 0
-        cpa_instituto = 0
+    # Calcular métricas adicionais (0 quando não há gasto ou conversões)
+    roi_instituto = instituto_ads_summary['roi']
+    cpa_instituto = instituto_ads_summary['cpa']
     
     # Summary metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -834,11 +1139,7 @@ with tab2:
     
     with col1:
         # Encontrar curso mais popular
-        cursos = instituto_orders[instituto_orders['categoria_produto'] == 'Cursos e Workshops']
-        cursos_populares = cursos.groupby('produto_nome').agg({
-            'produto_quantidade': 'sum',
-            'produto_valor_total': 'sum'
-        }).reset_index().sort_values('produto_valor_total', ascending=False)
+        cursos_populares = agregados['cursos_populares'].sort_values('produto_valor_total', ascending=False)
         
         if not cursos_populares.empty:
             curso_mais_vendido = cursos_populares.iloc[0]
@@ -881,26 +1182,28 @@ with tab2:
             'Valor': [instituto_orders_summary['total_vendas'], instituto_ads_summary['total_gasto']]
         })
         
-        fig = px.bar(
-            roi_data, 
-            x='Categoria', 
-            y='Valor',
-            text_auto='.2s',
-            title="Receita vs. Investimento (Instituto)",
-            color='Categoria',
-            color_discrete_sequence=['#4CAF50', '#2196F3']
-        )
-        fig.update_layout(
-            xaxis_title="",
-            yaxis_title="Valor (R$)",
-            yaxis_tickprefix="R$ "
-        )
+        def build_figure():
+            fig = px.bar(
+                roi_data, 
+                x='Categoria', 
+                y='Valor',
+                text_auto='.2s',
+                title="Receita vs. Investimento (Instituto)",
+                color='Categoria',
+                color_discrete_sequence=['#4CAF50', '#2196F3']
+            )
+            fig.update_layout(
+                xaxis_title="",
+                yaxis_title="Valor (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "Receita vs. Investimento (Instituto)", None, build_figure)
         st.plotly_chart(fig, use_container_width=True)
         
         # Calculate and display ROI
         if instituto_ads_summary['total_gasto'] > 0:
-            roi = ((instituto_orders_summary['total_vendas'] - instituto_ads_summary['total_gasto']) / instituto_ads_summary['total_gasto']) * 100
-            st.metric("ROI Instituto", f"{roi:.2f}%")
+            st.metric("ROI Instituto", f"{roi_instituto:.2f}%")
         else:
             st.metric("ROI Instituto", "N/A")
     
@@ -920,28 +1223,28 @@ with tab2:
     # Courses popularity
     st.subheader("Popularidade dos Cursos e Workshops")
     
-    # Find popular courses
-    cursos = instituto_orders[instituto_orders['categoria_produto'] == 'Cursos e Workshops']
-    cursos_populares = cursos.groupby('produto_nome').agg({
-        'produto_quantidade': 'sum',
-        'produto_valor_total': 'sum'
-    }).reset_index().sort_values('produto_valor_total', ascending=False)
+    # Find popular courses (mesmo agrupamento usado nos insights acima)
+    # Nomes como texto para que o gráfico não considere categorias sem vendas
+    cursos_populares['produto_nome'] = cursos_populares['produto_nome'].astype(str)
     
     if not cursos_populares.empty:
-        fig = px.bar(
-            cursos_populares,
-            x='produto_nome',
-            y='produto_valor_total',
-            text_auto='.2s',
-            title="Receita por Curso/Workshop",
-            color='produto_nome'
-        )
-        fig.update_layout(
-            xaxis_title="",
-            yaxis_title="Valor Total (R$)",
-            yaxis_tickprefix="R$ ",
-            xaxis_tickangle=-45
-        )
+        def build_figure():
+            fig = px.bar(
+                cursos_populares,
+                x='produto_nome',
+                y='produto_valor_total',
+                text_auto='.2s',
+                title="Receita por Curso/Workshop",
+                color='produto_nome'
+            )
+            fig.update_layout(
+                xaxis_title="",
+                yaxis_title="Valor Total (R$)",
+                yaxis_tickprefix="R$ ",
+                xaxis_tickangle=-45
+            )
+            return fig
+        fig = cached_figure(data_version, "Receita por Curso/Workshop", None, build_figure)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("Não foram encontrados dados de cursos e workshops.")
@@ -952,25 +1255,28 @@ with tab2:
     st.subheader("Vendas ao Longo do Mês (Instituto)")
     
     # Group by date
-    instituto_vendas_diarias = instituto_orders.groupby('pedido_data')['produto_valor_total'].sum().reset_index()
-    
-    fig = px.line(
-        instituto_vendas_diarias,
-        x='pedido_data',
-        y='produto_valor_total',
-        markers=True,
-        title="Vendas Diárias de Cursos e Workshops em Abril 2025",
-        labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
-    )
-    fig.update_layout(
-        xaxis_title="Data",
-        yaxis_title="Valor (R$)",
-        yaxis_tickprefix="R$ "
-    )
+    instituto_vendas_diarias = agregados['vendas_diarias']
+    
+    def build_figure():
+        fig = px.line(
+            instituto_vendas_diarias,
+            x='pedido_data',
+            y='produto_valor_total',
+            markers=True,
+            title="Vendas Diárias de Cursos e Workshops em Abril 2025",
+            labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
+        )
+        fig.update_layout(
+            xaxis_title="Data",
+            yaxis_title="Valor (R$)",
+            yaxis_tickprefix="R$ "
+        )
+        return fig
+    fig = cached_figure(data_version, "Vendas Diárias de Cursos e Workshops em Abril 2025", None, build_figure)
     st.plotly_chart(fig, use_container_width=True)
 
 # ---------- ECOMMERCE TAB ----------
-with tab3:
+def render_ecommerce():
     st.markdown("""
     <div class="tab-header">
         <h2>Ecommerce - Cafés e Produtos</h2>
@@ -995,23 +1301,24 @@ with tab3:
     )
     
     # Filter data for Ecommerce
-    ecommerce_orders = filter_dataframe(df_orders, 'tipo_venda', 'Ecommerce')
-    ecommerce_ads = filter_dataframe(df_ads, 'tipo_campanha', 'Ecommerce')
-    
-    ecommerce_orders_summary = get_orders_summary(ecommerce_orders)
-    ecommerce_ads_summary = get_ads_summary(ecommerce_ads)
-    
-    # Calcular métricas adicionais
-    if ecommerce_ads_summary['total_gasto'] > 0:
-        roi_ecommerce = ((ecommerce_orders_summary['total_vendas'] - ecommerce_ads_summary['total_gasto']) / 
-                        ecommerce_ads_summary['total_gasto']) * 100
-        cpa_ecommerce = ecommerce_ads_summary['total_gasto'] / ecommerce_ads_summary['total_conversoes'] if ecommerce_ads_summary['total_conversoes'] > 0 else 0
-    else:
-        roi_ecommerce = 0
-        cpa_ecommerce = 0
+    ecommerce_orders_summary, ecommerce_ads_summary = get_summaries(data_version, 'Ecommerce', orders_cube, df_ads)
+    
+    # Agregações da aba, calculadas em paralelo uma vez por versão dos dados
+    agregados = get_tab_aggregates(data_version, 'Ecommerce', {
+        'vendas_por_estado': lambda: rollup_cube(orders_cube, 'envio_estado', tipo_venda='Ecommerce'),
+        'produtos_mais_vendidos': lambda: rollup_cube(
+            orders_cube, 'produto_nome', ['produto_quantidade', 'produto_valor_total'],
+            tipo_venda='Ecommerce'
+        ),
+        'vendas_diarias': lambda: rollup_cube(orders_cube, 'pedido_data', tipo_venda='Ecommerce')
+    })
+    
+    # Calcular métricas adicionais (0 quando não há gasto ou conversões)
+    roi_ecommerce = ecommerce_ads_summary['roi']
+    cpa_ecommerce = ecommerce_ads_summary['cpa']
     
     # Calcular produtos vendidos
-    produtos_vendidos = ecommerce_orders['produto_quantidade'].sum()
+    produtos_vendidos = ecommerce_orders_summary['produtos_vendidos']
     
     # Summary metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -1060,9 +1367,7 @@ with tab3:
     st.markdown("### 🛒 Insights de Vendas de Produtos")
     
     # Agrupar por categorias para análise
-    vendas_por_categoria = ecommerce_orders.groupby('categoria_produto')['produto_valor_total'].sum().reset_index()
-    vendas_por_categoria.columns = ['Categoria', 'Valor Total']
-    vendas_por_categoria = vendas_por_categoria.sort_values('Valor Total', ascending=False)
+    vendas_por_categoria = ecommerce_orders_summary['vendas_por_categoria'].sort_values('Valor Total', ascending=False)
     
     col1, col2 = st.columns(2)
     
@@ -1081,7 +1386,7 @@ with tab3:
         
     with col2:
         # Análise de estados/regiões
-        vendas_por_estado = ecommerce_orders.groupby('envio_estado')['produto_valor_total'].sum().reset_index()
+        vendas_por_estado = agregados['vendas_por_estado']
         vendas_por_estado = vendas_por_estado.sort_values('produto_valor_total', ascending=False)
         
         if not vendas_por_estado.empty:
@@ -1100,10 +1405,7 @@ with tab3:
     
     with col1:
         # Produto mais vendido
-        produtos_mais_vendidos = ecommerce_orders.groupby('produto_nome').agg({
-            'produto_quantidade': 'sum',
-            'produto_valor_total': 'sum'
-        }).reset_index().sort_values('produto_valor_total', ascending=False)
+        produtos_mais_vendidos = agregados['produtos_mais_vendidos'].sort_values('produto_valor_total', ascending=False)
         
         if not produtos_mais_vendidos.empty:
             produto_mais_vendido = produtos_mais_vendidos.iloc[0]
@@ -1157,26 +1459,28 @@ with tab3:
             'Valor': [ecommerce_orders_summary['total_vendas'], ecommerce_ads_summary['total_gasto']]
         })
         
-        fig = px.bar(
-            roi_data, 
-            x='Categoria', 
-            y='Valor',
-            text_auto='.2s',
-            title="Receita vs. Investimento (Ecommerce)",
-            color='Categoria',
-            color_discrete_sequence=['#4CAF50', '#2196F3']
-        )
-        fig.update_layout(
-            xaxis_title="",
-            yaxis_title="Valor (R$)",
-            yaxis_tickprefix="R$ "
-        )
+        def build_figure():
+            fig = px.bar(
+                roi_data, 
+                x='Categoria', 
+                y='Valor',
+                text_auto='.2s',
+                title="Receita vs. Investimento (Ecommerce)",
+                color='Categoria',
+                color_discrete_sequence=['#4CAF50', '#2196F3']
+            )
+            fig.update_layout(
+                xaxis_title="",
+                yaxis_title="Valor (R$)",
+                yaxis_tickprefix="R$ "
+            )
+            return fig
+        fig = cached_figure(data_version, "Receita vs. Investimento (Ecommerce)", None, build_figure)
         st.plotly_chart(fig, use_container_width=True)
         
         # Calculate and display ROI
         if ecommerce_ads_summary['total_gasto'] > 0:
-            roi = ((ecommerce_orders_summary['total_vendas'] - ecommerce_ads_summary['total_gasto']) / ecommerce_ads_summary['total_gasto']) * 100
-            st.metric("ROI Ecommerce", f"{roi:.2f}%")
+            st.metric("ROI Ecommerce", f"{roi_ecommerce:.2f}%")
         else:
             st.metric("ROI Ecommerce", "N/A")
     
@@ -1196,19 +1500,18 @@ with tab3:
     # Products by category
     st.subheader("Vendas por Categoria de Produto")
     
-    # Group by product category
-    vendas_por_categoria = ecommerce_orders.groupby('categoria_produto')['produto_valor_total'].sum().reset_index()
-    vendas_por_categoria.columns = ['Categoria', 'Valor Total']
-    vendas_por_categoria = vendas_por_categoria.sort_values('Valor Total', ascending=False)
-    
-    fig = px.pie(
-        vendas_por_categoria,
-        values='Valor Total',
-        names='Categoria',
-        title="Distribuição de Vendas por Categoria",
-        color_discrete_sequence=px.colors.qualitative.Plotly
-    )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
+    # Mesmo agrupamento por categoria usado nos insights acima
+    def build_figure():
+        fig = px.pie(
+            vendas_por_categoria,
+            values='Valor Total',
+            names='Categoria',
+            title="Distribuição de Vendas por Categoria",
+            color_discrete_sequence=px.colors.qualitative.Plotly
+        )
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+        return fig
+    fig = cached_figure(data_version, "Distribuição de Vendas por Categoria", None, build_figure)
     st.plotly_chart(fig, use_container_width=True)
     
     st.divider()
@@ -1216,26 +1519,27 @@ with tab3:
     # Top products
     st.subheader("Produtos Mais Vendidos")
     
-    # Group by product
-    produtos_mais_vendidos = ecommerce_orders.groupby('produto_nome').agg({
-        'produto_quantidade': 'sum',
-        'produto_valor_total': 'sum'
-    }).reset_index().sort_values('produto_valor_total', ascending=False).head(10)
-    
-    fig = px.bar(
-        produtos_mais_vendidos,
-        x='produto_nome',
-        y='produto_valor_total',
-        text_auto='.2s',
-        title="Top 10 Produtos por Receita",
-        color='produto_nome'
-    )
-    fig.update_layout(
-        xaxis_title="",
-        yaxis_title="Valor Total (R$)",
-        yaxis_tickprefix="R$ ",
-        xaxis_tickangle=-45
-    )
+    # Top 10 do mesmo agrupamento por produto usado nos insights acima
+    produtos_mais_vendidos = produtos_mais_vendidos.head(10)
+    produtos_mais_vendidos['produto_nome'] = produtos_mais_vendidos['produto_nome'].astype(str)
+    
+    def build_figure():
+        fig = px.bar(
+            produtos_mais_vendidos,
+            x='produto_nome',
+            y='produto_valor_total',
+            text_auto='.2s',
+            title="Top 10 Produtos por Receita",
+            color='produto_nome'
+        )
+        fig.update_layout(
+            xaxis_title="",
+            yaxis_title="Valor Total (R$)",
+            yaxis_tickprefix="R$ ",
+            xaxis_tickangle=-45
+        )
+        return fig
+    fig = cached_figure(data_version, "Top 10 Produtos por Receita", None, build_figure)
     st.plotly_chart(fig, use_container_width=True)
     
     st.divider()
@@ -1244,25 +1548,28 @@ with tab3:
     st.subheader("Vendas ao Longo do Mês (Ecommerce)")
     
     # Group by date
-    ecommerce_vendas_diarias = ecommerce_orders.groupby('pedido_data')['produto_valor_total'].sum().reset_index()
-    
-    fig = px.line(
-        ecommerce_vendas_diarias,
-        x='pedido_data',
-        y='produto_valor_total',
-        markers=True,
-        title="Vendas Diárias de Produtos em Abril 2025",
-        labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
-    )
-    fig.update_layout(
-        xaxis_title="Data",
-        yaxis_title="Valor (R$)",
-        yaxis_tickprefix="R$ "
-    )
+    ecommerce_vendas_diarias = agregados['vendas_diarias']
+    
+    def build_figure():
+        fig = px.line(
+            ecommerce_vendas_diarias,
+            x='pedido_data',
+            y='produto_valor_total',
+            markers=True,
+            title="Vendas Diárias de Produtos em Abril 2025",
+            labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
+        )
+        fig.update_layout(
+            xaxis_title="Data",
+            yaxis_title="Valor (R$)",
+            yaxis_tickprefix="R$ "
+        )
+        return fig
+    fig = cached_figure(data_version, "Vendas Diárias de Produtos em Abril 2025", None, build_figure)
     st.plotly_chart(fig, use_container_width=True)
 
 # ---------- ORDERS TABLE TAB ----------
-with tab4:
+def render_tabela_pedidos():
     st.markdown("""
     <div class="tab-header">
         <h2>Tabela de Pedidos</h2>
@@ -1299,43 +1606,48 @@ with tab4:
     with col1:
         tipo_options = ['Todos'] + sorted(df_orders['tipo_venda'].unique().tolist())
         tipo_filter = st.selectbox('Tipo de Negócio', tipo_options, 
+                                  key=widget_key('filtro_tipo', 'Todos', tipo_options),
                                   help="Filtre por Instituto (cursos/workshops) ou Ecommerce (produtos)")
         
         status_options = ['Todos'] + sorted(df_orders['pedido_status'].unique().tolist())
         status_filter = st.selectbox('Status do Pedido', status_options,
+                                    key=widget_key('filtro_status', 'Todos', status_options),
                                     help="Status atual do pedido (entregue, em separação, etc.)")
     
     with col2:
         state_options = ['Todos'] + sorted(df_orders['envio_estado'].unique().tolist())
         state_filter = st.selectbox('Estado', state_options,
+                                   key=widget_key('filtro_estado', 'Todos', state_options),
                                    help="Estado brasileiro de destino do pedido")
         
         category_options = ['Todos'] + sorted(df_orders['categoria_produto'].unique().tolist())
         category_filter = st.selectbox('Categoria do Produto', category_options,
+                                      key=widget_key('filtro_categoria', 'Todos', category_options),
                                       help="Categoria do produto vendido")
     
     # Pesquisa por palavra-chave
     keyword_filter = st.text_input('Pesquisar por palavra-chave no nome do produto', 
                                   placeholder="Ex: Café, Curso, Barista...",
-                                  help="Digite uma palavra para buscar nos nomes dos produtos")
-    
-    # Apply filters
-    filtered_orders = df_orders.copy()
-    
-    if tipo_filter != 'Todos':
-        filtered_orders = filtered_orders[filtered_orders['tipo_venda'] == tipo_filter]
-    
-    if status_filter != 'Todos':
-        filtered_orders = filtered_orders[filtered_orders['pedido_status'] == status_filter]
-    
-    if state_filter != 'Todos':
-        filtered_orders = filtered_orders[filtered_orders['envio_estado'] == state_filter]
+                                  key=widget_key('filtro_palavra', ''),
+                                  help="Digite uma palavra para buscar nos nomes dos produtos (acentos são ignorados)")
+    
+    # Apply filters (combinação dos bitmaps do índice, uma única seleção de linhas)
+    filters = {
+        column: value for column, value in [
+            ('tipo_venda', tipo_filter),
+            ('pedido_status', status_filter),
+            ('envio_estado', state_filter),
+            ('categoria_produto', category_filter)
+        ] if value != 'Todos'
+    }
+    rows = filter_rows(orders_index, **filters)
     
-    if category_filter != 'Todos':
-        filtered_orders = filtered_orders[filtered_orders['categoria_produto'] == category_filter]
+    # Busca literal, sem diferenciar maiúsculas nem acentos ("cafe" encontra "Café")
+    keyword_rows = search_rows(orders_search_index, keyword_filter)
+    if keyword_rows is not None:
+        rows = keyword_rows if rows is None else np.intersect1d(rows, keyword_rows, assume_unique=True)
     
-    if keyword_filter:
-        filtered_orders = filtered_orders[filtered_orders['produto_nome'].str.contains(keyword_filter, case=False)]
+    filtered_orders = df_orders if rows is None else df_orders.take(rows)
     
     # Calcular número de linhas após filtro
     num_rows = len(filtered_orders)
@@ -1343,9 +1655,54 @@ with tab4:
     # Display the filtered table
     st.markdown(f"##### Mostrando {num_rows} resultados:")
     
+    # Paginação: apenas as linhas da página atual são enviadas ao navegador
+    col1, col2 = st.columns(2)
+    with col1:
+        page_size = st.selectbox('Linhas por página', PAGE_SIZE_OPTIONS,
+                                 key=widget_key('linhas_por_pagina', PAGE_SIZE_OPTIONS[1], PAGE_SIZE_OPTIONS),
+                                 help="Quantidade de pedidos exibidos por página")
+    num_pages = max((num_rows - 1) // page_size + 1, 1)
+    with col2:
+        # Volta à primeira página quando os filtros mudam
+        consulta = (tuple(filters.items()), keyword_filter, page_size)
+        widget_key('pagina', 1)
+        if st.session_state.get('pagina_consulta') != consulta:
+            st.session_state['pagina_consulta'] = consulta
+            st.session_state['pagina'] = 1
+        st.session_state['pagina'] = min(st.session_state['pagina'], num_pages)
+        page = st.number_input(f'Página (de {num_pages})', min_value=1, max_value=num_pages, step=1,
+                               key='pagina')
+    
+    # Sem filtros por linha (categoria, tipo, palavra-chave), os pedidos
+    # selecionados estão inteiros e as métricas vêm da tabela de pedidos
+    por_pedido = keyword_rows is None and set(filters) <= set(ORDER_FILTER_COLUMNS)
+    # Pedidos distintos: estimativa pelos sketches quando só há filtros por
+    # coluna, contagem exata pela tabela de pedidos nos demais casos
+    sketches = None
+    if num_rows > 0 and not por_pedido and DISTINCT_MODE == 'hll' and keyword_rows is None:
+        sketches = get_orders_sketches(data_version, df_orders)
+    
+    def build_filtered_summary():
+        if num_rows == 0:
+            return None
+        if por_pedido:
+            return summarize_orders(orders_table, rows)
+        if sketches is not None:
+            order_counts = estimate_orders(sketches, **filters)
+        else:
+            order_counts = count_orders(orders_table, rows)
+        return get_orders_summary(filtered_orders, order_counts)
+    
+    # Página da tabela e resumo dependem dos filtros: calculados em paralelo
+    resultados = run_chart_jobs({
+        'pagina': lambda: sorted_page(orders_sort_index, rows, page, page_size)[0],
+        'resumo': build_filtered_summary
+    })
+    page_rows = resultados['pagina']
+    
     st.markdown('<div class="dataframe-container">', unsafe_allow_html=True)
     st.dataframe(
-        filtered_orders.sort_values('pedido_data', ascending=False),
+        df_orders.take(page_rows),
         use_container_width=True,
         column_config={
             'pedido_id': st.column_config.NumberColumn('ID do Pedido', format="%d"),
@@ -1358,7 +1715,12 @@ with tab4:
             'produto_quantidade': st.column_config.NumberColumn('Quantidade', format="%d"),
             'produto_valor_total': st.column_config.NumberColumn('Valor Total', format="R$ %.2f"),
             'categoria_produto': st.column_config.Column('Categoria', help="Categoria do produto"),
-            'tipo_venda': st.column_config.Column('Tipo', help="Instituto ou Ecommerce")
+            'tipo_venda': st.column_config.Column('Tipo', help="Instituto ou Ecommerce"),
+            'periodo': st.column_config.Column('Período', help="Mês de referência do pedido (AAAA-MM)"),
+            # Colunas derivadas, usadas apenas nos gráficos
+            'pedido_timestamp': None,
+            'hora': None,
+            'dia_semana': None
         },
         hide_index=True
     )
@@ -1378,7 +1740,7 @@ with tab4:
     """, unsafe_allow_html=True)
     
     if num_rows > 0:
-        filtered_summary = get_orders_summary(filtered_orders)
+        filtered_summary = resultados['resumo']
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -1418,60 +1780,127 @@ with tab4:
         if num_rows >= 5:  # Só mostrar gráfico se houver dados suficientes
             st.subheader("Visualização Rápida dos Dados Filtrados")
             
+            opcoes_visualizacao = ["Vendas por Data", "Vendas por Estado", "Vendas por Categoria", "Pedidos por Hora"]
             visualization_type = st.radio(
                 "Escolha o tipo de visualização:",
-                ["Vendas por Data", "Vendas por Estado", "Vendas por Categoria"],
+                opcoes_visualizacao,
+                key=widget_key('tipo_visualizacao', opcoes_visualizacao[0], opcoes_visualizacao),
                 horizontal=True
             )
             
+            # Agregação e figura só são calculadas quando não estão no cache
+            filtros_grafico = (tuple(filters.items()), keyword_filter)
+            
             if visualization_type == "Vendas por Data":
-                vendas_diarias = filtered_orders.groupby('pedido_data')['produto_valor_total'].sum().reset_index()
-                
-                fig = px.line(
-                    vendas_diarias,
-                    x='pedido_data',
-                    y='produto_valor_total',
-                    markers=True,
-                    title="Vendas Diárias - Dados Filtrados",
-                    labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
-                )
-                fig.update_layout(
-                    xaxis_title="Data",
-                    yaxis_title="Valor (R$)",
-                    yaxis_tickprefix="R$ "
-                )
+                def build_figure():
+                    if por_pedido:
+                        vendas_diarias = sum_orders_by(orders_table, 'pedido_data', rows)
+                    else:
+                        vendas_diarias = filtered_orders.groupby('pedido_data', observed=True)['produto_valor_total'].sum().reset_index()
+                    
+                    fig = px.line(
+                        vendas_diarias,
+                        x='pedido_data',
+                        y='produto_valor_total',
+                        markers=True,
+                        title="Vendas Diárias - Dados Filtrados",
+                        labels={'pedido_data': 'Data', 'produto_valor_total': 'Valor Total (R$)'}
+                    )
+                    fig.update_layout(
+                        xaxis_title="Data",
+                        yaxis_title="Valor (R$)",
+                        yaxis_tickprefix="R$ "
+                    )
+                    return fig
+                fig = cached_figure(data_version, "Vendas Diárias - Dados Filtrados", filtros_grafico, build_figure)
                 st.plotly_chart(fig, use_container_width=True)
                 
             elif visualization_type == "Vendas por Estado":
-                vendas_por_estado = filtered_orders.groupby('envio_estado')['produto_valor_total'].sum().reset_index()
-                vendas_por_estado = vendas_por_estado.sort_values('produto_valor_total', ascending=False)
-                
-                fig = px.bar(
-                    vendas_por_estado,
-                    x='envio_estado',
-                    y='produto_valor_total',
-                    text_auto='.2s',
-                    title="Vendas por Estado - Dados Filtrados",
-                    color='envio_estado'
-                )
-                fig.update_layout(
-                    xaxis_title="Estado",
-                    yaxis_title="Valor (R$)",
-                    yaxis_tickprefix="R$ "
-                )
+                def build_figure():
+                    if por_pedido:
+                        vendas_por_estado = sum_orders_by(orders_table, 'envio_estado', rows)
+                    else:
+                        vendas_por_estado = filtered_orders.groupby('envio_estado', observed=True)['produto_valor_total'].sum().reset_index()
+                        # Pedidos distintos por estado, pela tabela de pedidos
+                        vendas_por_estado = vendas_por_estado.merge(
+                            count_orders_by(orders_table, 'envio_estado', rows), on='envio_estado'
+                        )
+                    vendas_por_estado = vendas_por_estado.sort_values('produto_valor_total', ascending=False)
+                    vendas_por_estado['envio_estado'] = vendas_por_estado['envio_estado'].astype(str)
+                    
+                    fig = px.bar(
+                        vendas_por_estado,
+                        x='envio_estado',
+                        y='produto_valor_total',
+                        text_auto='.2s',
+                        title="Vendas por Estado - Dados Filtrados",
+                        color='envio_estado',
+                        hover_data={'pedidos': True},
+                        labels={'pedidos': 'Pedidos'}
+                    )
+                    fig.update_layout(
+                        xaxis_title="Estado",
+                        yaxis_title="Valor (R$)",
+                        yaxis_tickprefix="R$ "
+                    )
+                    return fig
+                fig = cached_figure(data_version, "Vendas por Estado - Dados Filtrados", filtros_grafico, build_figure)
                 st.plotly_chart(fig, use_container_width=True)
                 
-            else:  # Vendas por Categoria
-                vendas_por_categoria = filtered_orders.groupby('categoria_produto')['produto_valor_total'].sum().reset_index()
-                vendas_por_categoria = vendas_por_categoria.sort_values('produto_valor_total', ascending=False)
-                
-                fig = px.pie(
-                    vendas_por_categoria,
-                    values='produto_valor_total',
-                    names='categoria_produto',
-                    title="Vendas por Categoria - Dados Filtrados"
-                )
-                fig.update_traces(textposition='inside', textinfo='percent+label')
+            elif visualization_type == "Vendas por Categoria":
+                def build_figure():
+                    vendas_por_categoria = filtered_orders.groupby('categoria_produto', observed=True)['produto_valor_total'].sum().reset_index()
+                    vendas_por_categoria = vendas_por_categoria.sort_values('produto_valor_total', ascending=False)
+                    
+                    fig = px.pie(
+                        vendas_por_categoria,
+                        values='produto_valor_total',
+                        names='categoria_produto',
+                        title="Vendas por Categoria - Dados Filtrados"
+                    )
+                    fig.update_traces(textposition='inside', textinfo='percent+label')
+                    return fig
+                fig = cached_figure(data_version, "Vendas por Categoria - Dados Filtrados", filtros_grafico, build_figure)
+                st.plotly_chart(fig, use_container_width=True)
+            
+            else:  # Pedidos por Hora
+                def build_figure():
+                    # Um pedido conta uma vez, na hora em que foi feito
+                    pedidos_por_hora = count_orders_by(orders_table, 'hora', rows)
+                    
+                    fig = px.bar(
+                        pedidos_por_hora,
+                        x='hora',
+                        y='pedidos',
+                        text_auto=True,
+                        title="Pedidos por Hora - Dados Filtrados",
+                        labels={'hora': 'Hora do Dia', 'pedidos': 'Pedidos'}
+                    )
+                    fig.update_layout(
+                        xaxis_title="Hora do Dia",
+                        yaxis_title="Pedidos",
+                        xaxis=dict(tickmode='linear', dtick=1)
+                    )
+                    return fig
+                fig = cached_figure(data_version, "Pedidos por Hora - Dados Filtrados", filtros_grafico, build_figure)
                 st.plotly_chart(fig, use_container_width=True)
     else:
         st.info("Aplique filtros que retornem dados para visualizar o resumo estatístico.")
+
+TAB_RENDERERS = {
+    "Geral": render_geral,
+    "Instituto": render_instituto,
+    "Ecommerce": render_ecommerce,
+    "Tabela de Pedidos": render_tabela_pedidos
+}
+
+if LAZY_TABS:
+    # Navegação entre seções: somente a aba ativa é executada a cada rerun
+    aba_ativa = st.radio("Seção", TAB_NAMES, horizontal=True, key="aba_ativa", label_visibility="collapsed")
+    TAB_RENDERERS[aba_ativa]()
+    save_widget_state()
+else:
+    # Create tabs for different sections
+    for tab, nome in zip(st.tabs(TAB_NAMES), TAB_NAMES):
+        with tab:
+            TAB_RENDERERS[nome]()
@@ -0,0 +1,354 @@
+"""
+Headless benchmark of the data pipeline and of the per-tab computations
+
+Generates synthetic pedidos*.csv / ads*.csv exports in the same schema as
+attached_assets, then times and memory-profiles each stage without starting
+Streamlit. Results are saved as JSON so runs of different versions can be
+compared:
+
+    python benchmark.py --sizes 10k,100k,1M,10M --output bench.json
+    python benchmark.py --sizes 10k,100k --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import utils
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'attached_assets')
+DEFAULT_SIZES = '10k,100k,1M,10M'
+
+# Produtos, status e estados sintéticos somam-se aos da exportação de exemplo
+EXTRA_PRODUCTS = [
+    ('Curso de Barista Básico', 450.0),
+    ('Workshop de Métodos de Preparo', 180.0),
+    ('Kit Degustação Terrafé', 120.0),
+    ('Xícara de Porcelana Terrafé', 45.0),
+    ('Aquarelas do Café - Quadro', 220.0),
+    ('Café Especial Terrafé - Frutado | 500g', 98.0)
+]
+EXTRA_STATES = ['BA', 'PR', 'PE', 'CE', 'PA', 'AM', 'MT', 'MS']
+CAMPAIGNS = ['[GUS] [ECOM]', '[GUS] [INSTITUTO]', '[ANA] [ECOM]', '[ANA] [INSTITUTO]', '[GUS] [ECOM] [REMARKETING]']
+
+def parse_size(text):
+    """
+    Number of lines from '10k', '1M', '250000'...
+    """
+    text = text.strip()
+    factor = {'k': 1_000, 'm': 1_000_000}.get(text[-1].lower(), 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+def sample_headers():
+    """
+    Header lines of the sample exports, copied verbatim to the synthetic files
+    """
+    headers = {}
+    for kind in ('ads', 'pedidos'):
+        with open(os.path.join(SAMPLE_DIR, f'{kind}abril.csv'), encoding='utf-8') as f:
+            headers[kind] = f.readline().rstrip('\r\n')
+    return headers
+
+def sample_catalog():
+    """
+    Products (name, unit price), statuses and states of the sample orders
+    plus synthetic ones
+    """
+    sample = pd.read_csv(os.path.join(SAMPLE_DIR, 'pedidosabril.csv'), sep=';', decimal=',')
+    products = sample.groupby(sample.columns[5])[sample.columns[6]].first()
+    products = list(products.items()) + EXTRA_PRODUCTS
+    statuses = sample[sample.columns[3]].unique().tolist()
+    states = sample[sample.columns[4]].unique().tolist() + EXTRA_STATES
+    return products, statuses, states
+
+def generate_orders(n_lines, file_path, header, seed=0, first_id=3000):
+    """
+    Synthetic orders export with n_lines product lines (about 1.4 lines per
+    order) spread over April 2025, with order ids from first_id
+    Without header, only the lines are written (to be appended to an export)
+    """
+    rng = np.random.default_rng(seed)
+    products, statuses, states = sample_catalog()
+
+    # Cada linha abre um pedido novo com probabilidade 0,7
+    new_order = rng.random(n_lines) < 0.7
+    new_order[0] = True
+    order = np.cumsum(new_order) - 1
+    n_orders = order[-1] + 1
+
+    dias = rng.integers(1, 31, n_orders)
+    minutos = rng.integers(7 * 60, 23 * 60, n_orders)
+    produto = rng.integers(0, len(products), n_lines)
+    quantidade = rng.integers(1, 4, n_lines)
+    precos = np.array([price for _, price in products])
+
+    df = pd.DataFrame({
+        'pedido_id': first_id + order,
+        'pedido_data': pd.Categorical.from_codes(dias - 1, [f'{d:02d}/04/2025' for d in range(1, 31)])[order],
+        'pedido_hora': pd.Categorical.from_codes(minutos - 7 * 60, [f'{m // 60:02d}:{m % 60:02d}' for m in range(7 * 60, 23 * 60)])[order],
+        'pedido_status': pd.Categorical.from_codes(rng.integers(0, len(statuses), n_orders), statuses)[order],
+        'envio_estado': pd.Categorical.from_codes(rng.integers(0, len(states), n_orders), states)[order],
+        'produto_nome': pd.Categorical.from_codes(produto, [name for name, _ in products]),
+        'produto_valor_unitario': precos[produto],
+        'produto_quantidade': quantidade,
+        'produto_valor_total': precos[produto] * quantidade
+    })
+    write_export(df, file_path, header)
+
+def generate_ads(n_lines, file_path, header, seed=0):
+    """
+    Synthetic ads export with n_lines daily campaign rows in April 2025
+    """
+    rng = np.random.default_rng(seed + 1)
+    dias = pd.Categorical.from_codes(rng.integers(0, 30, n_lines), [f'2025-04-{d:02d}' for d in range(1, 31)])
+    impressoes = rng.integers(100, 5000, n_lines)
+    cliques = rng.binomial(impressoes, 0.01)
+    views = rng.binomial(cliques, 0.7)
+    adicoes = rng.binomial(views, 0.08)
+    gasto = np.round(impressoes * rng.uniform(0.01, 0.03, n_lines), 2)
+
+    df = pd.DataFrame({
+        'data_inicio': dias,
+        'data_fim': dias,
+        'nome_campanha': pd.Categorical.from_codes(rng.integers(0, len(CAMPAIGNS), n_lines), CAMPAIGNS),
+        'alcance': (impressoes * 0.8).astype(np.int64),
+        'impressoes': impressoes,
+        'cpm': utils.safe_divide(gasto, impressoes) * 1000,
+        'cliques': cliques,
+        'cpc': utils.safe_divide(gasto, cliques),
+        'views_pagina': views,
+        'custo_view_pagina': utils.safe_divide(gasto, views),
+        'adicoes_carrinho': adicoes,
+        'custo_adicao_carrinho': utils.safe_divide(gasto, adicoes),
+        'valor_conversao_carrinho': adicoes * 85.0,
+        'valor_gasto': gasto
+    })
+    write_export(df, file_path, header)
+
+def write_export(df, file_path, header):
+    """
+    Write a frame as an export: ';' separated, decimal commas, CRLF lines and
+    the original header line (None = lines only)
+    """
+    with open(file_path, 'w', encoding='utf-8', newline='') as f:
+        if header is not None:
+            f.write(header + '\r\n')
+        df.to_csv(f, sep=';', decimal=',', float_format='%.2f', header=False, index=False, lineterminator='\r\n')
+
+def measure(stage, func, memory=True):
+    """
+    Wall time of one run of func and, with memory, the peak of memory
+    allocated during a second run (tracemalloc slows the run it watches)
+    tracemalloc sees Python and NumPy allocations, not Arrow's memory pool
+    Returns (result, measurement dict)
+    """
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    measurement = {'stage': stage, 'seconds': round(seconds, 6)}
+    if memory:
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        measurement['peak_mb'] = round(peak / 2**20, 3)
+    return result, measurement
+
+def reset_loader(cache_dir):
+    """
+    Forget the processed exports (memory and disk) so the next load is cold
+    """
+    utils._loaded_exports.clear()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+def run_size(n_lines, ads_ratio, workdir, memory=True):
+    """
+    Generate the exports for one size and measure every stage
+    """
+    data_dir = os.path.join(workdir, f'data-{n_lines}')
+    cache_dir = os.path.join(workdir, f'cache-{n_lines}')
+    os.makedirs(data_dir, exist_ok=True)
+    headers = sample_headers()
+    orders_path = os.path.join(data_dir, 'pedidosabril.csv')
+    ads_path = os.path.join(data_dir, 'adsabril.csv')
+    utils.CACHE_DIR = cache_dir
+
+    results = []
+    def stage(name, func, measure_memory=memory):
+        result, measurement = measure(name, func, measure_memory)
+        results.append(measurement)
+        print(f"{n_lines:>10} {name:<28} {measurement['seconds']:>9.3f}s"
+              + (f" {measurement['peak_mb']:>9.1f} MB" if 'peak_mb' in measurement else ''), flush=True)
+        return result
+
+    stage('generate_csv', lambda: (
+        generate_orders(n_lines, orders_path, headers['pedidos']),
+        generate_ads(max(int(n_lines * ads_ratio), 1), ads_path, headers['ads'])
+    ), False)
+
+    # Pipeline de carga: fria (CSV), do cache em disco e do cache em memória
+    stage('load_and_process_data_cold', lambda: (reset_loader(cache_dir), utils.load_and_process_data(data_dir))[1])
+    utils._loaded_exports.clear()
+    stage('load_and_process_data_disk', lambda: (utils._loaded_exports.clear(), utils.load_and_process_data(data_dir))[1])
+    df_ads, df_orders = stage('load_and_process_data_warm', lambda: utils.load_and_process_data(data_dir))
+
+    # Exportação que cresce: cópia já carregada à qual se acrescentam 1% de
+    # linhas (pedidos novos) antes de cada carga, lida de forma incremental
+    append_dir = os.path.join(workdir, f'append-{n_lines}')
+    shutil.copytree(data_dir, append_dir, dirs_exist_ok=True)
+    append_path = os.path.join(append_dir, 'pedidosabril.csv')
+    append_lines = max(n_lines // 100, 1)
+    deltas = []
+    for run in range(2):
+        delta_path = os.path.join(workdir, f'delta-{n_lines}-{run}.csv')
+        generate_orders(append_lines, delta_path, None, seed=run + 1, first_id=3000 + n_lines * (run + 2))
+        with open(delta_path, 'rb') as f:
+            deltas.append(f.read())
+    utils.load_and_process_data(append_dir)
+
+    def append_and_load():
+        with open(append_path, 'ab') as f:
+            f.write(deltas.pop(0))
+        return utils.load_and_process_data(append_dir)
+    stage('load_and_process_data_append', append_and_load)
+    utils.load_orders_cube(append_dir)
+
+    # Exportação acima de STREAMING_MIN_BYTES (lida em blocos de
+    # STREAMING_CHUNK_ROWS linhas) contra a leitura única, com o pico de memória
+    orders_cache = utils.get_cache_path(orders_path, 'orders', utils.file_hash(orders_path))
+    streaming_min_bytes = utils.STREAMING_MIN_BYTES
+    try:
+        utils.STREAMING_MIN_BYTES = 0
+        stage('load_orders_single_read', lambda: utils.load_export(orders_path, 'orders', orders_cache))
+        utils.STREAMING_MIN_BYTES = min(streaming_min_bytes or 1, os.path.getsize(orders_path))
+        stage('load_orders_streaming', lambda: utils.load_export(orders_path, 'orders', orders_cache))
+    finally:
+        utils.STREAMING_MIN_BYTES = streaming_min_bytes
+
+    stage('read_orders_csv', lambda: utils.read_orders_csv(orders_path))
+    raw_orders = utils.read_orders_csv(orders_path)
+    stage('process_order_data', lambda: utils.process_order_data(raw_orders.copy()))
+    stage('process_ad_data', lambda: utils.process_ad_data(utils.read_ads_csv(ads_path)))
+    stage('categorize_products', lambda: utils.categorize_products(df_orders['produto_nome']))
+    stage('categorize_product_scalar', lambda: [utils.categorize_product(name) for name in df_orders['produto_nome'].cat.categories])
+
+    # Resumos
+    stage('get_orders_summary', lambda: utils.get_orders_summary(df_orders))
+    stage('get_ads_summary', lambda: utils.get_ads_summary(df_ads))
+    cube = stage('build_orders_cube', lambda: utils.build_orders_cube(df_orders))
+    for tipo in (None, 'Instituto', 'Ecommerce'):
+        stage(f'get_cube_summary_{tipo or "todos"}', lambda: utils.get_cube_summary(cube, tipo))
+
+    # Cálculos das abas Geral, Instituto e Ecommerce
+    matrix = stage('weekday_hour_matrix', lambda: utils.build_weekday_hour_matrix(df_orders))
+    stage('tab_geral', lambda: (
+        utils.rollup_cube(cube, 'tipo_venda'),
+        utils.rollup_cube(cube, 'pedido_data'),
+        utils.rollup_cube(cube, 'envio_estado'),
+        utils.weekday_hour_totals(matrix, 'dia_semana'),
+        utils.weekday_hour_totals(matrix, 'hora'),
+        utils.get_ads_kpis(df_ads, 'tipo_campanha')
+    ))
+    attribution = stage('attribute_sales', lambda: utils.attribute_sales(
+        utils.rollup_cube(cube, ['pedido_data', 'tipo_venda']), utils.build_ads_daily(df_ads)
+    ))
+    stage('attribution_roi', lambda: (
+        utils.get_attribution_roi(attribution, 'data'),
+        utils.get_attribution_roi(attribution, 'nome_campanha')
+    ))
+    stage('tab_instituto_ecommerce', lambda: [
+        utils.rollup_cube(cube, by, ['produto_quantidade', 'produto_valor_total'], tipo_venda=tipo)
+        for tipo in ('Instituto', 'Ecommerce') for by in ('produto_nome', 'pedido_data', 'envio_estado')
+    ])
+
+    # Aba Tabela de Pedidos: índices e uma consulta filtrada
+    filter_index = stage('build_filter_index', lambda: utils.build_filter_index(df_orders))
+    search_index = stage('build_search_index', lambda: utils.build_search_index(df_orders['produto_nome']))
+    sort_index = stage('build_sort_index', lambda: utils.build_sort_index(df_orders, 'pedido_data', ascending=False))
+    orders_table = stage('build_orders_table', lambda: utils.build_orders_table(df_orders))
+
+    def table_query():
+        rows = utils.filter_rows(filter_index, tipo_venda='Ecommerce', envio_estado='SP')
+        rows = np.intersect1d(rows, utils.search_rows(search_index, 'cafe'), assume_unique=True)
+        page_rows, _ = utils.sorted_page(sort_index, rows, 1, 50)
+        return utils.get_orders_summary(df_orders.take(rows), utils.count_orders(orders_table, rows)), page_rows
+    stage('tab_tabela_pedidos_query', table_query)
+
+    for result in results:
+        result['lines'] = n_lines
+    return results
+
+def git_revision():
+    """
+    Current commit of the repository, when available
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, previous_path):
+    """
+    Print the time ratio of each stage against a previous results file
+    """
+    with open(previous_path, encoding='utf-8') as f:
+        previous = {(r['lines'], r['stage']): r for r in json.load(f)['results']}
+    print(f"\nComparação com {previous_path} (atual / anterior)")
+    for result in results:
+        before = previous.get((result['lines'], result['stage']))
+        if before and before['seconds'] > 0:
+            print(f"{result['lines']:>10} {result['stage']:<28} {result['seconds'] / before['seconds']:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de dados do dashboard")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Linhas de pedidos por execução (ex.: 10k,100k,1M,10M)")
+    parser.add_argument('--ads-ratio', type=float, default=0.01, help="Linhas de anúncios por linha de pedido")
+    parser.add_argument('--output', default=f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json", help="Arquivo JSON de resultados")
+    parser.add_argument('--compare', help="Resultados anteriores para comparação")
+    parser.add_argument('--workdir', help="Diretório para os CSVs gerados (padrão: temporário, removido ao final)")
+    parser.add_argument('--no-memory', action='store_true', help="Mede apenas o tempo (sem tracemalloc)")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='dashboard-bench-')
+    results = []
+    try:
+        for size in args.sizes.split(','):
+            results.extend(run_size(parse_size(size), args.ads_ratio, workdir, not args.no_memory))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'cpus': os.cpu_count(),
+            'platform': platform.platform()
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados salvos em {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
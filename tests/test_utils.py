@@ -0,0 +1,131 @@
+"""
+Checks of the indexed and pre-aggregated order computations in utils
+against the same results computed with plain pandas
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+import utils
+
+MEASURES = ['produto_valor_total', 'produto_quantidade', 'linhas']
+
+@pytest.fixture(scope='module')
+def exports(tmp_path_factory):
+    """
+    Synthetic orders exports: in id order and with the lines shuffled, so
+    orders are split and out of order
+    """
+    directory = tmp_path_factory.mktemp('exports')
+    header = benchmark.sample_headers()['pedidos']
+    ordered = str(directory / 'pedidosabril.csv')
+    benchmark.generate_orders(3000, ordered, header, seed=7)
+
+    with open(ordered, encoding='utf-8', newline='') as f:
+        lines = f.readlines()
+    rng = np.random.default_rng(7)
+    shuffled = str(directory / 'pedidosmaio.csv')
+    with open(shuffled, 'w', encoding='utf-8', newline='') as f:
+        f.write(lines[0])
+        f.writelines(lines[i] for i in rng.permutation(np.arange(1, len(lines))))
+    return {'ordered': ordered, 'shuffled': shuffled}
+
+@pytest.fixture(scope='module')
+def df_orders(exports):
+    return utils.load_export(exports['shuffled'], 'orders')[0]
+
+def cube_totals(cube):
+    """
+    Cube cells in a canonical order, for comparisons
+    """
+    return cube.groupby(utils.CUBE_DIMENSIONS, observed=True)[MEASURES + ['pedidos', 'pedidos_tipo']].sum().sort_index()
+
+FILTERS = [
+    {},
+    {'tipo_venda': 'Ecommerce'},
+    {'pedido_status': 'Pedido Entregue'},
+    {'envio_estado': 'SP', 'tipo_venda': 'Instituto'},
+    {'categoria_produto': 'Café', 'envio_estado': 'RJ'}
+]
+
+def filter_mask(df, filters):
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in filters.items():
+        mask &= (df[col] == value).to_numpy()
+    return mask
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_filter_rows_matches_boolean_mask(df_orders, filters):
+    rows = utils.filter_rows(utils.build_filter_index(df_orders), **filters)
+    expected = np.flatnonzero(filter_mask(df_orders, filters))
+    if not filters:
+        assert rows is None
+    else:
+        np.testing.assert_array_equal(rows, expected)
+
+@pytest.mark.parametrize('query', ['cafe', 'Café', 'CURSO', 'kit degus', 'grão 1', '|', '500g', 'inexistente', ' kit ', 'kit ', ' ', '  '])
+def test_search_rows_matches_substring_mask(df_orders, query):
+    rows = utils.search_rows(utils.build_search_index(df_orders['produto_nome']), query)
+    names = df_orders['produto_nome'].astype(str).map(utils.normalize_text)
+    expected = np.flatnonzero(names.str.contains(utils.normalize_text(query), regex=False).to_numpy())
+    np.testing.assert_array_equal(rows, expected)
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_count_orders_matches_nunique(df_orders, filters):
+    rows = utils.filter_rows(utils.build_filter_index(df_orders), **filters)
+    counts = utils.count_orders(utils.build_orders_table(df_orders), rows)
+
+    selected = df_orders if rows is None else df_orders.take(rows)
+    assert counts['total_pedidos'] == selected['pedido_id'].nunique()
+    expected = selected.groupby('pedido_status', observed=True)['pedido_id'].nunique()
+    status_counts = counts['status_counts'].set_index('Status')['Contagem']
+    assert status_counts.to_dict() == expected.to_dict()
+
+@pytest.mark.parametrize('filters', FILTERS)
+def test_estimate_orders_within_hll_error(df_orders, filters):
+    estimate = utils.estimate_orders(utils.build_orders_sketches(df_orders), **filters)
+    exact = df_orders[filter_mask(df_orders, filters)]['pedido_id'].nunique()
+    # Erro padrão do HyperLogLog: 1,04 / raiz(m); a tolerância é de 4 erros
+    # padrão, com ao menos 2 pedidos nas contagens pequenas
+    tolerance = max(4 * 1.04 / np.sqrt(2 ** utils.HLL_PRECISION) * exact, 2)
+    assert abs(estimate['total_pedidos'] - exact) <= tolerance
+
+@pytest.mark.parametrize('split', [1, 1234, 2999])
+def test_update_orders_cube_matches_full_rebuild(df_orders, split):
+    previous, new = df_orders.iloc[:split], df_orders.iloc[split:]
+    cube = utils.build_orders_cube(previous)
+    updated = utils.update_orders_cube(cube, new, previous, utils.get_high_water_mark(previous))
+    pd.testing.assert_frame_equal(cube_totals(updated), cube_totals(utils.build_orders_cube(df_orders)))
+
+@pytest.mark.parametrize('export', ['ordered', 'shuffled'])
+@pytest.mark.parametrize('chunk_rows', [61, 500])
+def test_streamed_cube_matches_single_read(exports, export, chunk_rows):
+    df, cube = utils.stream_orders_export(exports[export], chunk_rows=chunk_rows)
+    expected = utils.load_export(exports[export], 'orders')[0]
+
+    pd.testing.assert_frame_equal(df, expected, check_categorical=False)
+    pd.testing.assert_frame_equal(cube_totals(cube), cube_totals(utils.build_orders_cube(expected)))
+    assert cube['pedidos'].sum() == expected['pedido_id'].nunique()
+
+@pytest.mark.parametrize('filters', FILTERS)
+@pytest.mark.parametrize('page', [1, 3])
+def test_sorted_page_matches_sort_values(df_orders, filters, page):
+    sort_index = utils.build_sort_index(df_orders, 'pedido_data', ascending=False)
+    rows = utils.filter_rows(utils.build_filter_index(df_orders), **filters)
+    page_rows, total = utils.sorted_page(sort_index, rows, page, 50)
+
+    selected = df_orders.reset_index(drop=True)
+    if rows is not None:
+        selected = selected.take(rows)
+    expected = selected.sort_values('pedido_data', ascending=False, kind='stable').index.to_numpy()
+    assert total == len(expected)
+    np.testing.assert_array_equal(page_rows, expected[(page - 1) * 50:page * 50])
+
+@pytest.mark.parametrize('ascending', [True, False])
+def test_sort_index_puts_missing_dates_last(ascending):
+    dates = pd.to_datetime(['2025-04-02', None, '2025-04-01', '2025-04-03', None, '2025-04-02'])
+    df = pd.DataFrame({'pedido_data': dates})
+    sort_index = utils.build_sort_index(df, 'pedido_data', ascending=ascending)
+    expected = df.sort_values('pedido_data', ascending=ascending, kind='stable', na_position='last').index
+    np.testing.assert_array_equal(sort_index, expected.to_numpy())
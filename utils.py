@@ -2,47 +2,924 @@ import pandas as pd
 import numpy as np
 import re
 import os
+import hashlib
+import io
+import logging
+import mmap
+import multiprocessing
+import pickle
+import shutil
+import threading
+import time
+import types
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def load_and_process_data():
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Cache em disco desativado sem pyarrow
+    pa = feather = None
+
+try:
+    import redis
+except ImportError:  # Backend Redis indisponível sem o pacote redis
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Diretório com as exportações mensais (loja e Meta Ads)
+DATA_DIR = os.environ.get(
+    'DASHBOARD_DATA_DIR',
+    os.path.join(os.path.dirname(__file__), 'attached_assets')
+)
+
+# Prefixos dos arquivos exportados: adsabril.csv, pedidosabril.csv, ...
+EXPORT_PREFIXES = {
+    'ads': 'ads',
+    'orders': 'pedidos'
+}
+
+# Cache colunar (Arrow IPC) compartilhado entre processos e reinícios
+CACHE_DIR = os.environ.get(
+    'DASHBOARD_CACHE_DIR',
+    os.path.join(os.path.dirname(__file__), '.cache')
+)
+
+# Incrementar sempre que o processamento mudar, invalidando o cache em disco
+CACHE_VERSION = 6
+
+# Cache de resultados compartilhado entre os workers: 'off' (padrão),
+# 'memory' (LRU no processo), 'disk' (arquivos em CACHE_DIR/shared lidos por
+# memory-map) ou uma URL redis://host:porta/db
+SHARED_CACHE = os.environ.get('DASHBOARD_SHARED_CACHE', 'off')
+SHARED_CACHE_TTL = int(os.environ.get('DASHBOARD_SHARED_CACHE_TTL', '3600'))
+SHARED_CACHE_MAX_MB = int(os.environ.get('DASHBOARD_SHARED_CACHE_MB', '512'))
+
+# Colunas e tipos das exportações, aplicados já na leitura do CSV
+ADS_COLUMNS = [
+    'data_inicio', 'data_fim', 'nome_campanha', 'alcance', 'impressoes',
+    'cpm', 'cliques', 'cpc', 'views_pagina', 'custo_view_pagina',
+    'adicoes_carrinho', 'custo_adicao_carrinho', 'valor_conversao_carrinho',
+    'valor_gasto'
+]
+ADS_DTYPES = {
+    'nome_campanha': str,
+    'cpm': 'float64',
+    'cpc': 'float64',
+    'custo_view_pagina': 'float64',
+    'custo_adicao_carrinho': 'float64',
+    'valor_conversao_carrinho': 'float64',
+    'valor_gasto': 'float64'
+}
+
+ORDER_COLUMNS = [
+    'pedido_id', 'pedido_data', 'pedido_hora', 'pedido_status', 
+    'envio_estado', 'produto_nome', 'produto_valor_unitario', 
+    'produto_quantidade', 'produto_valor_total'
+]
+# Valores monetários ficam em float64: em float32 os totais perdem os centavos
+ORDER_DTYPES = {
+    'pedido_id': 'int32',
+    'pedido_hora': str,
+    'pedido_status': 'category',
+    'envio_estado': 'category',
+    'produto_nome': 'category',
+    'produto_valor_unitario': 'float64',
+    'produto_quantidade': 'int32',
+    'produto_valor_total': 'float64'
+}
+
+# Colunas de baixa cardinalidade guardadas como categorias (códigos inteiros)
+ADS_CATEGORY_COLUMNS = ['nome_campanha', 'tipo_campanha', 'responsavel', 'canal']
+ORDER_CATEGORY_COLUMNS = [
+    'pedido_hora', 'pedido_status', 'envio_estado', 'produto_nome',
+    'categoria_produto', 'tipo_venda'
+]
+
+# Regras de categorização de produtos, avaliadas em ordem (a primeira que
+# casar define a categoria). Para incluir uma categoria basta adicionar uma linha.
+CATEGORY_RULES = [
+    {'categoria': 'Cursos e Workshops', 'padrao': r'\b(?:Curso|Oficina|Workshop)\b', 'regex': True, 'case': False},
+    {'categoria': 'Café', 'padrao': 'Café', 'regex': False, 'case': True},
+    {'categoria': 'Kits', 'padrao': 'Kit', 'regex': False, 'case': True},
+    {'categoria': 'Acessórios', 'padrao': 'Xícara', 'regex': False, 'case': True},
+    {'categoria': 'Arte', 'padrao': 'Aquarelas', 'regex': False, 'case': True},
+    {'categoria': 'Alimentos', 'padrao': 'Doce', 'regex': False, 'case': True},
+]
+DEFAULT_CATEGORY = 'Outros'
+
+# Tipo de venda de cada categoria; categorias ausentes são Ecommerce
+CATEGORY_TIPO_VENDA = {
+    'Cursos e Workshops': 'Instituto'
+}
+DEFAULT_TIPO_VENDA = 'Ecommerce'
+
+# Tags entre colchetes nos nomes de campanhas ("[GUS] [ECOM]"); a posição da
+# tag define o nível da hierarquia e a tag INSTITUTO define o tipo
+CAMPAIGN_TAG_PATTERN = r'\[\s*([^\]]+?)\s*\]'
+CAMPAIGN_TAG_LEVELS = {'responsavel': 0, 'canal': 1}
+CAMPAIGN_TIPO_TAGS = {
+    'INSTITUTO': 'Instituto'
+}
+DEFAULT_TIPO_CAMPANHA = 'Ecommerce'
+
+# Exportações de pedidos que só receberam linhas novas são processadas de
+# forma incremental (DASHBOARD_INCREMENTAL=0 reprocessa o arquivo inteiro)
+INCREMENTAL_LOAD = os.environ.get('DASHBOARD_INCREMENTAL', '1') != '0'
+
+# Exportações de pedidos a partir deste tamanho são lidas em blocos de
+# STREAMING_CHUNK_ROWS linhas gravados no cache em disco: o CSV bruto nunca é
+# lido de uma vez, mas o dataframe processado completo continua em memória
+# (o painel precisa dele). Pico: dataframe processado + um bloco com cache em
+# disco, cerca de 2x o dataframe sem ele (DASHBOARD_STREAMING_MB=0 desativa)
+STREAMING_MIN_BYTES = int(float(os.environ.get('DASHBOARD_STREAMING_MB', '256')) * 2**20)
+STREAMING_CHUNK_ROWS = int(os.environ.get('DASHBOARD_CHUNK_ROWS', '250000'))
+
+# Arquivos já processados neste processo: caminho -> assinatura, hash,
+# dataframe, cubo e marca d'água (high-water mark) dos pedidos
+_loaded_exports = {}
+# Serializa as cargas (sessões e atualização em segundo plano)
+_load_lock = threading.RLock()
+
+# Intervalo, em segundos, entre as verificações do diretório de dados pela
+# atualização em segundo plano. Desativada por padrão (0): cada rerun compara
+# a versão dos dados e recarrega sob demanda; DASHBOARD_REFRESH_SECONDS=30
+# liga a thread de atualização
+REFRESH_INTERVAL = float(os.environ.get('DASHBOARD_REFRESH_SECONDS', '0'))
+
+def find_exports(path=None):
+    """
+    Find every ads/orders CSV export under the data directory
+    Returns a dict with the sorted file paths for 'ads' and 'orders'
+    """
+    path = path or DATA_DIR
+    exports = {kind: [] for kind in EXPORT_PREFIXES}
+    
+    for root, _, files in os.walk(path):
+        for name in files:
+            lower = name.lower()
+            if not lower.endswith('.csv'):
+                continue
+            for kind, prefix in EXPORT_PREFIXES.items():
+                if lower.startswith(prefix):
+                    exports[kind].append(os.path.join(root, name))
+    
+    return {kind: sorted(files) for kind, files in exports.items()}
+
+def file_signature(file_path):
+    """
+    Cheap change detector for an export (modification time and size)
+    """
+    stat = os.stat(file_path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def get_data_version(path=None):
+    """
+    Identify the current set of exports, changes whenever a file is
+    added, removed or modified
+    """
+    exports = find_exports(path)
+    digest = hashlib.sha1()
+    for kind in sorted(exports):
+        for file_path in exports[kind]:
+            digest.update(f"{kind}|{file_path}|{file_signature(file_path)}".encode())
+    return digest.hexdigest()
+
+def file_hash(file_path, size=None):
+    """
+    Content hash of an export file (or of its first size bytes)
+    """
+    return _hash_state(file_path, size).hexdigest()
+
+def _hash_state(file_path, size=None):
+    """
+    SHA-1 object fed with an export file (or its first size bytes), which
+    can be copied and fed the bytes appended later
+    """
+    digest = hashlib.sha1()
+    remaining = size
+    with open(file_path, 'rb') as f:
+        while remaining is None or remaining > 0:
+            block = f.read(1 << 20 if remaining is None else min(1 << 20, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest
+
+# Amostras comparadas para saber se o início de uma exportação continua o
+# mesmo quando ela cresce: primeiro e último bloco e blocos intermediários
+FINGERPRINT_BLOCK = 1 << 16
+FINGERPRINT_SAMPLES = 16
+
+def prefix_fingerprint(file_path, size):
+    """
+    Cheap identity of the first size bytes of an export, read from a fixed
+    number of sampled blocks (like file_signature, it trusts that a rewrite
+    changes the sampled bytes)
+    """
+    digest = hashlib.sha1(str(size).encode())
+    offsets = np.linspace(0, max(size - FINGERPRINT_BLOCK, 0), FINGERPRINT_SAMPLES, dtype=np.int64)
+    with open(file_path, 'rb') as f:
+        for offset in dict.fromkeys(offsets.tolist()):
+            f.seek(offset)
+            digest.update(f.read(min(FINGERPRINT_BLOCK, size - offset)))
+    return digest.hexdigest()
+
+def split_last_line(file_path, size):
+    """
+    Offset just past the last line break among the first size bytes of an
+    export, and the bytes after it (a last line without a line break, which
+    may still be being written)
+    """
+    with open(file_path, 'rb') as f:
+        end = size
+        tail = b''
+        while end > 0:
+            start = max(end - FINGERPRINT_BLOCK, 0)
+            f.seek(start)
+            tail = f.read(end - start) + tail
+            position = tail.rfind(b'\n', 0, len(tail) - (size - end))
+            if position >= 0:
+                return start + position + 1, tail[position + 1:]
+            end = start
+    return 0, tail
+
+def _cache_prefix(file_path, kind):
+    """
+    Prefix shared by every cache entry of one source file
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    path_digest = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:8]
+    return f"{kind}-{stem}-{path_digest}-"
+
+def get_cache_path(file_path, kind, digest=None):
+    """
+    Location of the processed frame in the on-disk cache, keyed by the
+    source file hash and modification time
+    """
+    if feather is None:
+        return None
+    mtime = os.stat(file_path).st_mtime_ns
+    digest = digest or file_hash(file_path)
+    name = f"{_cache_prefix(file_path, kind)}v{CACHE_VERSION}-{digest[:16]}-{mtime}.arrow"
+    return os.path.join(CACHE_DIR, name)
+
+def read_cached_export(cache_path):
+    """
+    Memory-map a processed frame from the cache, None when missing or unreadable
+    Exports read in chunks are stored as a directory of parts
+    """
+    if cache_path is None:
+        return None
+    try:
+        if os.path.isdir(cache_path + '.parts'):
+            return read_cached_parts(cache_path + '.parts')
+        if os.path.exists(cache_path):
+            return feather.read_table(cache_path, memory_map=True).to_pandas()
+    except Exception:
+        pass
+    return None
+
+def read_cached_parts(parts_dir):
+    """
+    Join the memory-mapped parts of an export read in chunks into a single
+    frame, converting once from Arrow instead of concatenating a frame per
+    part; categories come out as concat_frames would combine them
+    """
+    parts = sorted(name for name in os.listdir(parts_dir) if name.startswith('part-'))
+    tables = [
+        feather.read_table(os.path.join(parts_dir, name), memory_map=True)
+        for name in parts
+    ]
+    
+    # Cada parte usa o menor tipo inteiro para os seus valores e códigos de
+    # categorias: o tipo comum é o mais largo, como em pd.concat
+    schema = tables[0].schema
+    for i, field in enumerate(schema):
+        types = [table.schema.field(i).type for table in tables]
+        if pa.types.is_dictionary(field.type):
+            index_type = max((t.index_type for t in types), key=lambda t: t.bit_width)
+            schema = schema.set(i, field.with_type(
+                pa.dictionary(index_type, field.type.value_type, field.type.ordered)
+            ))
+        elif pa.types.is_integer(field.type):
+            schema = schema.set(i, field.with_type(max(types, key=lambda t: t.bit_width)))
+    table = pa.concat_tables([table.cast(schema) for table in tables])
+    df = table.unify_dictionaries().to_pandas()
+    
+    for i, field in enumerate(schema):
+        if not pa.types.is_dictionary(field.type):
+            continue
+        categories = None
+        for chunk in table.column(i).chunks:
+            part = pd.Index(chunk.dictionary.to_pandas())
+            categories = part if categories is None else categories.union(part)
+        if categories is not None:
+            df[field.name] = df[field.name].cat.set_categories(categories)
+    return df
+
+def read_cached_cube(cache_path):
+    """
+    Orders cube stored next to the parts of an export read in chunks, if any
+    """
+    if cache_path is None:
+        return None
+    cube_path = os.path.join(cache_path + '.parts', 'cube.arrow')
+    try:
+        if os.path.exists(cube_path):
+            return feather.read_table(cube_path, memory_map=True).to_pandas()
+    except Exception:
+        pass
+    return None
+
+def _remove_stale_cache(cache_path, file_path, kind):
+    """
+    Remove the older cache entries (files or part directories) of a source file
+    """
+    prefix = _cache_prefix(file_path, kind)
+    current = {cache_path, cache_path + '.parts'}
+    for name in os.listdir(CACHE_DIR):
+        stale = os.path.join(CACHE_DIR, name)
+        if not name.startswith(prefix) or stale in current:
+            continue
+        if name.endswith('.arrow'):
+            os.remove(stale)
+        elif name.endswith('.arrow.parts'):
+            shutil.rmtree(stale, ignore_errors=True)
+
+def write_cached_export(df, cache_path, file_path, kind):
+    """
+    Store a processed frame in the cache, replacing older entries of the
+    same source file
+    """
+    if cache_path is None:
+        return
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # Sem compressão para que a leitura possa usar memory-map
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, cache_path)
+        _remove_stale_cache(cache_path, file_path, kind)
+    except OSError:
+        # Sistema de arquivos somente leitura: seguir sem cache
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def append_cached_export(delta, cube, old_path, cache_path, file_path):
+    """
+    Move the cache entry of an orders export that only grew to its new key
+    and store the appended lines as one more part (and the updated cube),
+    instead of rewriting the frame; nothing is written without an entry
+    """
+    if old_path is None or cache_path is None:
+        return
+    parts_dir = cache_path + '.parts'
+    try:
+        if os.path.isdir(old_path + '.parts'):
+            if old_path != cache_path:
+                os.replace(old_path + '.parts', parts_dir)
+        elif os.path.exists(old_path):
+            os.makedirs(parts_dir, exist_ok=True)
+            os.replace(old_path, os.path.join(parts_dir, 'part-00000.arrow'))
+        else:
+            return
+        
+        number = sum(name.startswith('part-') for name in os.listdir(parts_dir))
+        if len(delta):
+            feather.write_feather(
+                delta.reset_index(drop=True), os.path.join(parts_dir, f"part-{number:05d}.arrow"),
+                compression='uncompressed'
+            )
+        cube_path = os.path.join(parts_dir, 'cube.arrow')
+        if cube is None:
+            if os.path.exists(cube_path):
+                os.remove(cube_path)
+        else:
+            feather.write_feather(cube, cube_path + '.tmp', compression='uncompressed')
+            os.replace(cube_path + '.tmp', cube_path)
+        _remove_stale_cache(cache_path, file_path, 'orders')
+    except OSError:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+def read_ads_csv(file_path):
+    """
+    Read an ads export parsing decimal commas and dates while reading
+    """
+    return pd.read_csv(
+        file_path,
+        sep=';',
+        decimal=',',
+        header=0,
+        names=ADS_COLUMNS,
+        dtype=ADS_DTYPES,
+        parse_dates=['data_inicio', 'data_fim'],
+        date_format='%Y-%m-%d'
+    )
+
+def read_orders_csv(file_path, header=0, chunksize=None):
+    """
+    Read an orders export parsing decimal commas, dates and compact dtypes
+    while reading (header=None for a chunk without the header line)
+    With chunksize, returns an iterator over frames of that many lines
+    """
+    return pd.read_csv(
+        file_path,
+        sep=';',
+        decimal=',',
+        header=header,
+        names=ORDER_COLUMNS,
+        dtype=ORDER_DTYPES,
+        parse_dates=['pedido_data'],
+        date_format='%d/%m/%Y',
+        chunksize=chunksize
+    )
+
+def concat_frames(frames):
+    """
+    Concatenate processed frames, keeping categorical columns categorical
+    even when each frame has its own set of categories
+    """
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    if len(frames) > 1:
+        for col in frames[0].columns:
+            if not all(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+                continue
+            categories = frames[0][col].cat.categories
+            for f in frames[1:]:
+                categories = categories.union(f[col].cat.categories)
+            frames = [f.assign(**{col: f[col].cat.set_categories(categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+def add_periodo(df, kind):
+    """
+    Add the reference month (AAAA-MM) of each row
+    """
+    date_column = 'data_inicio' if kind == 'ads' else 'pedido_data'
+    df['periodo'] = df[date_column].dt.strftime('%Y-%m').astype('category')
+    return df
+
+def _add_sorted_run(runs, keys):
+    """
+    Add keys to a list of sorted runs, merging runs of similar size so the
+    list stays logarithmic and each key is merged O(log n) times
+    """
+    run = np.unique(keys)
+    while runs and len(runs[-1]) <= len(run):
+        run = np.union1d(runs.pop(), run)
+    runs.append(run)
+
+def _in_sorted_runs(runs, keys):
+    """
+    Mask of the keys present in any of the sorted runs
+    """
+    found = np.zeros(len(keys), dtype=bool)
+    for run in runs:
+        positions = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+        found |= run[positions] == keys
+    return found
+
+def stream_orders_export(file_path, cache_path=None, chunk_rows=STREAMING_CHUNK_ROWS, pending=0):
+    """
+    Read an orders export in chunks of chunk_rows lines. Each chunk is
+    processed, spilled to the on-disk store as one part and reduced to its
+    own cube; the chunk cubes are merged once at the end
+    The last pending lines (a last line without a line break) are returned
+    with the frame but left out of the cube and of the stored parts
+    The processed frame is still returned whole (read back from the
+    memory-mapped parts in a single conversion): peak memory is that frame
+    plus one chunk, or about twice the frame without a cache directory,
+    where the chunks are kept and concatenated
+    Returns the processed frame and the cube of its complete lines
+    """
+    parts_dir = None if cache_path is None else cache_path + '.parts'
+    tmp_dir = None if parts_dir is None else f"{parts_dir}.{os.getpid()}.tmp"
+    if tmp_dir is not None:
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+        except OSError:
+            tmp_dir = None
+    
+    chunks = []
+    cubes = []
+    state = {'high_water_mark': None}
+    # Pedidos e pares (pedido_id, tipo_venda) já vistos, em chaves inteiras
+    # ordenadas, para não contar de novo um pedido dividido entre blocos
+    seen_orders = []
+    seen_pairs = []
+    tipo_codes = {}
+    
+    def add_chunk(chunk, number):
+        ids = chunk['pedido_id'].to_numpy().astype(np.int64)
+        tipos = chunk['tipo_venda']
+        codes = np.array([tipo_codes.setdefault(t, len(tipo_codes)) for t in tipos.cat.categories])
+        pairs = (ids << 16) | codes[tipos.cat.codes.to_numpy()]
+        
+        known = None
+        below = below_high_water_mark(chunk, state['high_water_mark'])
+        if below.any():
+            known = (np.zeros(len(chunk), dtype=bool), np.zeros(len(chunk), dtype=bool))
+            known[0][below] = _in_sorted_runs(seen_orders, ids[below])
+            known[1][below] = _in_sorted_runs(seen_pairs, pairs[below])
+        cubes.append(build_orders_cube(chunk, known=known))
+        _add_sorted_run(seen_orders, ids)
+        _add_sorted_run(seen_pairs, pairs)
+        state['high_water_mark'] = merge_high_water_marks(
+            state['high_water_mark'], get_high_water_mark(chunk)
+        )
+        return spill(chunk, number)
+    
+    def spill(chunk, number):
+        if tmp_dir is None:
+            chunks.append(chunk)
+            return True
+        try:
+            feather.write_feather(
+                chunk, os.path.join(tmp_dir, f"part-{number:05d}.arrow"), compression='uncompressed'
+            )
+            return True
+        except OSError:
+            return False
+    
+    # Cada bloco é finalizado quando o seguinte chega: só o último pode
+    # conter as linhas pendentes
+    last = None
+    for number, chunk in enumerate(read_orders_csv(file_path, chunksize=chunk_rows)):
+        chunk = add_periodo(process_order_data(chunk.reset_index(drop=True)), 'orders')
+        if last is not None and not add_chunk(*last):
+            # Sem espaço para as partes: recomeçar mantendo os blocos em memória
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return stream_orders_export(file_path, None, chunk_rows, pending)
+        last = (chunk, number)
+    
+    if last is None:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        df = add_periodo(process_order_data(read_orders_csv(file_path)), 'orders')
+        return df, build_orders_cube(df.iloc[:max(len(df) - pending, 0)])
+    
+    chunk, number = last
+    complete = len(chunk) - min(pending, len(chunk))
+    tail = chunk.iloc[complete:].reset_index(drop=True)
+    ok = add_chunk(chunk.iloc[:complete], number) if complete else True
+    if ok and len(tail):
+        ok = spill(tail, number + 1)
+    if not ok:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return stream_orders_export(file_path, None, chunk_rows, pending)
+    
+    cube = merge_cubes(cubes) if cubes else build_orders_cube(tail.iloc[:0])
+    if tmp_dir is None:
+        return concat_frames(chunks), cube
+    
+    try:
+        df = read_cached_parts(tmp_dir)
+        # A linha pendente não faz parte do cache
+        if len(tail):
+            os.remove(os.path.join(tmp_dir, f"part-{number + 1:05d}.arrow"))
+        feather.write_feather(cube, os.path.join(tmp_dir, 'cube.arrow'), compression='uncompressed')
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        os.replace(tmp_dir, parts_dir)
+        _remove_stale_cache(cache_path, file_path, 'orders')
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return stream_orders_export(file_path, None, chunk_rows, pending)
+    return df, cube
+
+def load_export(file_path, kind, cache_path=None, pending=0):
+    """
+    Load and process a single export file
+    Returns the processed frame and, for orders read in chunks, its cube
+    The last pending lines of an orders export (a last line without a line
+    break) are left out of the cache and of the cube
+    """
+    if kind == 'orders' and 0 < STREAMING_MIN_BYTES <= os.path.getsize(file_path):
+        return stream_orders_export(file_path, cache_path, pending=pending)
+    
+    if kind == 'ads':
+        df = process_ad_data(read_ads_csv(file_path))
+    else:
+        df = process_order_data(read_orders_csv(file_path))
+    df = add_periodo(df, kind)
+    
+    write_cached_export(df.iloc[:max(len(df) - pending, 0)] if pending else df, cache_path, file_path, kind)
+    return df, None
+
+def get_high_water_mark(df_orders):
+    """
+    Highest order id and latest order date already loaded
+    """
+    if df_orders.empty:
+        return None
+    return {
+        'pedido_id': int(df_orders['pedido_id'].max()),
+        'pedido_data': df_orders['pedido_data'].max()
+    }
+
+def below_high_water_mark(df_orders, high_water_mark):
+    """
+    Lines that may belong to orders already loaded: order id and date not
+    beyond the high-water mark (everything else is a new order)
+    """
+    if high_water_mark is None:
+        return np.zeros(len(df_orders), dtype=bool)
+    return (
+        (df_orders['pedido_id'] <= high_water_mark['pedido_id']) &
+        (df_orders['pedido_data'] <= high_water_mark['pedido_data'])
+    ).to_numpy()
+
+def read_line_tail(tail):
+    """
+    Process lines of an orders export read without its header
+    """
+    return add_periodo(process_order_data(read_orders_csv(io.BytesIO(tail), header=None)), 'orders')
+
+def load_appended_orders(file_path, previous, signature):
+    """
+    Bring a loaded orders export that only grew up to date, reading from
+    the end of its last complete line: the new lines are processed on their
+    own, the cube is updated with them and they are added to the cached
+    frame as one more part. Nothing proportional to the lines already
+    loaded is re-read, hashed or rewritten, except the concatenated frame
+    Returns the new entry, or None when the file was rewritten rather than
+    appended or the new lines cannot be read on their own, in which case it
+    must be reprocessed as a whole
+    """
+    consumed = previous['consumed']
+    size = signature[1]
+    if not consumed or size < consumed:
+        return None
+    if prefix_fingerprint(file_path, consumed) != previous['fingerprint']:
+        return None
+    
+    with open(file_path, 'rb') as f:
+        f.seek(consumed)
+        tail = f.read(size - consumed)
+    # Linhas completas, e a última linha quando ainda não terminou
+    cut = tail.rfind(b'\n') + 1
+    pending = 1 if tail[cut:].strip() else 0
+    
+    base = previous['df'].iloc[:previous['rows']]
+    if tail.strip():
+        try:
+            delta = read_line_tail(tail)
+        except ValueError:
+            logger.warning("Linhas novas de '%s' inválidas; reprocessando o arquivo", file_path)
+            return None
+        df = concat_frames([base, delta])
+    else:
+        delta = base.iloc[:0]
+        df = base
+    complete = delta.iloc[:max(len(delta) - pending, 0)]
+    
+    hasher = previous['hasher'].copy()
+    hasher.update(tail[:cut])
+    base_cube = previous['base_cube']
+    if base_cube is not None and len(complete):
+        base_cube = update_orders_cube(base_cube, complete, base, previous['high_water_mark'])
+    high_water_mark = merge_high_water_marks(
+        previous['high_water_mark'], get_high_water_mark(complete)
+    )
+    
+    cache_path = get_cache_path(file_path, 'orders', hasher.hexdigest())
+    append_cached_export(complete, base_cube, previous['cache_path'], cache_path, file_path)
+    return _store_export(
+        file_path, 'orders', signature, hasher, consumed + cut, cache_path,
+        df, len(base) + len(complete), base_cube, high_water_mark
+    )
+
+def merge_high_water_marks(first, second):
+    """
+    Combined high-water mark of two sets of orders
+    """
+    if first is None or second is None:
+        return first or second
+    return {key: max(first[key], second[key]) for key in first}
+
+def _store_export(file_path, kind, signature, hasher, consumed, cache_path, df,
+                  rows=None, base_cube=None, high_water_mark=None):
     """
-    Load and process both CSV files
+    Remember a processed export: its frame, of which the first rows come
+    from complete lines (the rest is a last line still without a line
+    break), the hash and fingerprint of those lines for later appends and,
+    for orders, their cube and high-water mark
+    """
+    rows = len(df) if rows is None else rows
+    if kind == 'orders' and high_water_mark is None:
+        high_water_mark = get_high_water_mark(df.iloc[:rows])
+    entry = {
+        'kind': kind,
+        'signature': signature,
+        'hasher': hasher,
+        'consumed': consumed,
+        'fingerprint': prefix_fingerprint(file_path, consumed),
+        'cache_path': cache_path,
+        'df': df,
+        'rows': rows,
+        'base_cube': base_cube,
+        # Cubo com a linha pendente, montado em load_orders_cube
+        'cube': base_cube if base_cube is not None and rows == len(df) else None,
+        'high_water_mark': high_water_mark
+    }
+    _loaded_exports[file_path] = entry
+    return entry
+
+def load_export_entries(files, kind, max_workers=None):
+    """
+    Bring the processed frames of every export of one kind up to date:
+    unchanged files are reused (in memory or from the on-disk cache),
+    appended orders exports only process their new lines and the rest are
+    parsed in parallel
+    The on-disk cache of an orders export is keyed by the hash of its
+    complete lines; a last line without a line break is read apart
+    """
+    entries = {}
+    pending = []
+    
+    for file_path in files:
+        signature = file_signature(file_path)
+        previous = _loaded_exports.get(file_path)
+        if previous is not None and previous['signature'] == signature:
+            entries[file_path] = previous
+            continue
+        
+        if INCREMENTAL_LOAD and kind == 'orders' and previous is not None:
+            entry = load_appended_orders(file_path, previous, signature)
+            if entry is not None:
+                entries[file_path] = entry
+                continue
+        
+        if kind == 'orders':
+            consumed, tail = split_last_line(file_path, signature[1])
+        else:
+            consumed, tail = signature[1], b''
+        tail_rows = 1 if tail.strip() else 0
+        hasher = _hash_state(file_path, consumed)
+        # Sem nenhuma linha completa não há o que guardar em cache
+        cache_path = get_cache_path(file_path, kind, hasher.hexdigest()) if consumed else None
+        
+        df = read_cached_export(cache_path)
+        if df is not None:
+            rows = len(df)
+            if tail_rows:
+                df = concat_frames([df, read_line_tail(tail)])
+            base_cube = read_cached_cube(cache_path) if kind == 'orders' else None
+            entries[file_path] = _store_export(
+                file_path, kind, signature, hasher, consumed, cache_path, df, rows, base_cube
+            )
+            continue
+        
+        pending.append((file_path, signature, hasher, consumed, cache_path, tail_rows))
+    
+    def store(job, result):
+        file_path, signature, hasher, consumed, cache_path, tail_rows = job
+        df, base_cube = result
+        rows = max(len(df) - tail_rows, 0)
+        entries[file_path] = _store_export(
+            file_path, kind, signature, hasher, consumed, cache_path, df, rows, base_cube
+        )
+    
+    if len(pending) == 1:
+        job = pending[0]
+        store(job, load_export(job[0], kind, job[4], job[5]))
+    elif pending:
+        workers = min(len(pending), max_workers or os.cpu_count() or 1)
+        # 'spawn' em vez de fork: um processo filho criado por fork herdaria
+        # locks mantidos por outras threads (logging, atualização) e travaria
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            results = executor.map(
+                load_export,
+                [job[0] for job in pending],
+                [kind] * len(pending),
+                [job[4] for job in pending],
+                [job[5] for job in pending]
+            )
+            for job, result in zip(pending, results):
+                store(job, result)
+    
+    # Esquecer arquivos que foram removidos do diretório
+    for file_path in list(_loaded_exports):
+        if _loaded_exports[file_path]['kind'] == kind and file_path not in entries:
+            del _loaded_exports[file_path]
+    
+    return [entries[file_path] for file_path in files]
+
+def load_exports(files, kind, max_workers=None):
+    """
+    Load every export of one kind into a single processed frame
+    """
+    entries = load_export_entries(files, kind, max_workers)
+    return concat_frames(entry['df'] for entry in entries)
+
+def load_orders_cube(path=None):
+    """
+    Orders cube of every export under the data directory
+    Each export keeps its own cube, updated with only the appended lines on
+    incremental loads, and the cubes are merged (exports are assumed not to
+    repeat orders from other exports)
+    """
+    files = find_exports(path)['orders']
+    entries = load_export_entries(files, 'orders')
+    for entry in entries:
+        if entry['cube'] is not None:
+            continue
+        df, rows = entry['df'], entry['rows']
+        if entry['base_cube'] is None:
+            entry['base_cube'] = build_orders_cube(df.iloc[:rows])
+        entry['cube'] = entry['base_cube']
+        if rows < len(df):
+            entry['cube'] = update_orders_cube(
+                entry['base_cube'], df.iloc[rows:], df.iloc[:rows], entry['high_water_mark']
+            )
+    return merge_cubes(entry['cube'] for entry in entries)
+
+def load_and_process_data(path=None):
+    """
+    Load and process every ads and orders export under the data directory
     Returns processed dataframes for ads and orders
     """
-    # Determine path
-    path = os.path.join(os.path.dirname(__file__), 'attached_assets')
+    exports = find_exports(path)
+    
+    for kind, files in exports.items():
+        if not files:
+            raise FileNotFoundError(
+                f"Nenhum arquivo '{EXPORT_PREFIXES[kind]}*.csv' encontrado em {path or DATA_DIR}"
+            )
     
     # Load ad campaign data
-    ads_path = os.path.join(path, 'adsabril.csv')
-    df_ads = pd.read_csv(ads_path, sep=';')
+    df_ads = load_exports(exports['ads'], 'ads')
     
     # Load order data
-    orders_path = os.path.join(path, 'pedidosabril.csv')
-    df_orders = pd.read_csv(orders_path, sep=';')
+    df_orders = load_exports(exports['orders'], 'orders')
     
-    # Process ad campaign data
-    df_ads = process_ad_data(df_ads)
+    return df_ads, df_orders
+
+def load_snapshot(path=None, attempts=3):
+    """
+    Immutable snapshot of the data directory: data version, processed ads
+    and orders frames and orders cube, all from the same set of exports
+    (reloaded if a file changes while loading)
+    """
+    with _load_lock:
+        for _ in range(attempts):
+            data_version = get_data_version(path)
+            # Os frames não passam pelo cache compartilhado: cada worker os lê
+            # do cache em disco (Arrow), sem copiá-los por pickle
+            df_ads, df_orders = load_and_process_data(path)
+            snapshot = {'df_ads': df_ads, 'df_orders': df_orders, 'orders_cube': load_orders_cube(path)}
+            if get_data_version(path) == data_version:
+                break
+        return types.MappingProxyType(dict(snapshot, data_version=data_version))
+
+class DataRefresher:
+    """
+    Background thread that polls the data directory and, when the exports
+    change, loads a new snapshot off the request path and swaps it in with a
+    single reference assignment; readers keep the snapshot they started with
+    """
+    def __init__(self, path=None, interval=REFRESH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.snapshot = load_snapshot(path)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='dashboard-refresh', daemon=True)
+        self._thread.start()
     
-    # Process order data
-    df_orders = process_order_data(df_orders)
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if get_data_version(self.path) != self.snapshot['data_version']:
+                    self.snapshot = load_snapshot(self.path)
+                    logger.info("Dados atualizados: versão %s", self.snapshot['data_version'][:12])
+            except Exception:
+                # Mantém o snapshot anterior até a próxima verificação
+                logger.exception("Falha ao atualizar os dados em segundo plano")
     
-    return df_ads, df_orders
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
 
 def process_ad_data(df):
     """
     Process advertising data
     """
     # Rename columns to be more user-friendly
-    df.columns = [
-        'data_inicio', 'data_fim', 'nome_campanha', 'alcance', 'impressoes',
-        'cpm', 'cliques', 'cpc', 'views_pagina', 'custo_view_pagina',
-        'adicoes_carrinho', 'custo_adicao_carrinho', 'valor_conversao_carrinho',
-        'valor_gasto'
-    ]
+    df.columns = ADS_COLUMNS
     
-    # Convert date columns to datetime
-    df['data_inicio'] = pd.to_datetime(df['data_inicio'], format='%Y-%m-%d')
-    df['data_fim'] = pd.to_datetime(df['data_fim'], format='%Y-%m-%d')
+    # Convert date columns to datetime (already parsed by read_ads_csv)
+    for col in ['data_inicio', 'data_fim']:
+        if not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format='%Y-%m-%d')
     
     # Convert numeric columns to appropriate types
     numeric_columns = ['alcance', 'impressoes', 'cpm', 'cliques', 'cpc', 
@@ -54,48 +931,73 @@ def process_ad_data(df):
         if df[col].dtype == 'object':
             df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
     
-    # Extract campaign type
-    df['tipo_campanha'] = df['nome_campanha'].apply(
-        lambda x: 'Instituto' if '[INSTITUTO]' in x else 'Ecommerce'
-    )
+    # Extract campaign type and hierarchy levels (responsável, canal) from
+    # the bracket tags, parsed once per distinct campaign name
+    tag_index = build_campaign_tag_index(df['nome_campanha'])
+    df['tipo_campanha'] = get_tipo_campanha(tag_index)
+    for level in CAMPAIGN_TAG_LEVELS:
+        df[level] = campaign_tag_level(tag_index, level)
+    
+    # Calculate metrics (0 onde não há cliques ou gasto)
+    kpis = ads_kpis(df)
+    df['taxa_conversao'] = kpis['taxa_conversao']
+    df['roi'] = kpis['roi']
     
-    # Calculate metrics
-    df['taxa_conversao'] = (df['adicoes_carrinho'] / df['cliques']) * 100
-    df['roi'] = ((df['valor_conversao_carrinho'] - df['valor_gasto']) / df['valor_gasto']) * 100
+    # Compact memory representation
+    df, _ = compact_dataframe(df, ADS_CATEGORY_COLUMNS)
     
     return df
 
+def order_timestamps(dates, times):
+    """
+    Combine pedido_data and pedido_hora ('HH:MM' or 'HH:MM:SS') into a
+    datetime64 timestamp, parsing each distinct time only once
+    """
+    times = times.astype('category')
+    labels = times.cat.categories.astype(str)
+    labels = labels.where(labels.str.count(':') == 2, labels + ':00')
+    offsets = pd.to_timedelta(labels).to_numpy()
+    codes = times.cat.codes.to_numpy()
+    
+    line_offsets = np.where(codes >= 0, offsets[codes.clip(0)], np.timedelta64('NaT'))
+    return pd.Series(dates.to_numpy() + line_offsets, index=dates.index)
+
 def process_order_data(df):
     """
     Process order data
     """
     # Rename columns to be more user-friendly
-    df.columns = [
-        'pedido_id', 'pedido_data', 'pedido_hora', 'pedido_status', 
-        'envio_estado', 'produto_nome', 'produto_valor_unitario', 
-        'produto_quantidade', 'produto_valor_total'
-    ]
+    df.columns = ORDER_COLUMNS
     
-    # Convert data types
-    df['pedido_id'] = df['pedido_id'].astype(int)
+    # Convert data types (read_orders_csv already parses them while reading)
+    for col in ['pedido_id', 'produto_quantidade']:
+        if not pd.api.types.is_integer_dtype(df[col]):
+            df[col] = df[col].astype(ORDER_DTYPES[col])
     
     # Handle numeric columns with comma as decimal separator
     numeric_columns = ['produto_valor_unitario', 'produto_valor_total']
     for col in numeric_columns:
-        df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
-    
-    df['produto_quantidade'] = df['produto_quantidade'].astype(int)
+        if df[col].dtype == 'object':
+            df[col] = df[col].astype(str).str.replace(',', '.').astype(float)
     
     # Convert date to datetime
-    df['pedido_data'] = pd.to_datetime(df['pedido_data'], format='%d/%m/%Y')
+    if not pd.api.types.is_datetime64_any_dtype(df['pedido_data']):
+        df['pedido_data'] = pd.to_datetime(df['pedido_data'], format='%d/%m/%Y')
+    
+    # Data e hora combinadas uma única vez, com hora (0-23) e dia da semana
+    # (0 = segunda) em inteiros pequenos para os gráficos temporais
+    df['pedido_timestamp'] = order_timestamps(df['pedido_data'], df['pedido_hora'])
+    df['hora'] = df['pedido_timestamp'].dt.hour.fillna(-1).astype('int8')
+    df['dia_semana'] = df['pedido_timestamp'].dt.dayofweek.fillna(-1).astype('int8')
     
     # Extract categories
-    df['categoria_produto'] = df['produto_nome'].apply(categorize_product)
+    df['categoria_produto'] = categorize_products(df['produto_nome'])
     
     # Add tipo_venda column (Instituto or Ecommerce)
-    df['tipo_venda'] = df['categoria_produto'].apply(
-        lambda x: 'Instituto' if x == 'Cursos e Workshops' else 'Ecommerce'
-    )
+    df['tipo_venda'] = get_tipo_venda(df['categoria_produto'])
+    
+    # Compact memory representation
+    df, _ = compact_dataframe(df, ORDER_CATEGORY_COLUMNS)
     
     return df
 
@@ -103,44 +1005,364 @@ def categorize_product(product_name):
     """
     Categorize products based on their names
     """
-    if re.search(r'\b(Curso|Oficina|Workshop)\b', product_name, re.IGNORECASE):
-        return 'Cursos e Workshops'
-    elif 'Café' in product_name:
-        return 'Café'
-    elif 'Kit' in product_name:
-        return 'Kits'
-    elif 'Xícara' in product_name:
-        return 'Acessórios'
-    elif 'Aquarelas' in product_name:
-        return 'Arte'
-    elif 'Doce' in product_name:
-        return 'Alimentos'
+    return categorize_products(pd.Series([product_name]))[0]
+
+def categorize_products(product_names):
+    """
+    Categorize a series of product names using CATEGORY_RULES
+    Each distinct name is matched only once and the result is broadcast
+    back to every row
+    """
+    codes, uniques = pd.factorize(product_names, sort=False)
+    uniques = pd.Series(uniques, dtype=object)
+    
+    categories = np.full(len(uniques), DEFAULT_CATEGORY, dtype=object)
+    pending = np.ones(len(uniques), dtype=bool)
+    for rule in CATEGORY_RULES:
+        if not pending.any():
+            break
+        mask = uniques.str.contains(
+            rule['padrao'], case=rule['case'], regex=rule['regex']
+        ).to_numpy(dtype=bool) & pending
+        categories[mask] = rule['categoria']
+        pending &= ~mask
+    
+    # Nomes ausentes (código -1) ficam na categoria padrão
+    if (codes == -1).any():
+        categories = np.append(categories, DEFAULT_CATEGORY)
+    category_codes, category_names = pd.factorize(categories, sort=True)
+    return pd.Categorical.from_codes(category_codes[codes], categories=category_names)
+
+def get_tipo_venda(categories):
+    """
+    Map product categories to their tipo_venda (Instituto or Ecommerce)
+    """
+    codes, uniques = pd.factorize(categories, sort=False)
+    tipos = [CATEGORY_TIPO_VENDA.get(c, DEFAULT_TIPO_VENDA) for c in uniques]
+    if (codes == -1).any():
+        tipos.append(DEFAULT_TIPO_VENDA)
+    tipo_codes, tipo_names = pd.factorize(np.array(tipos, dtype=object), sort=True)
+    return pd.Categorical.from_codes(tipo_codes[codes], categories=tipo_names)
+
+def build_campaign_tag_index(campaign_names):
+    """
+    Parse the bracket tags of each distinct campaign name once
+    Returns the row campaign codes, the distinct names and their tags (in
+    order), from which per-row columns are built with one lookup per row
+    """
+    codes, uniques = pd.factorize(campaign_names, sort=False)
+    tags = pd.Series(uniques, dtype=object).str.findall(CAMPAIGN_TAG_PATTERN).tolist()
+    
+    return {
+        'codes': codes,
+        'campaigns': list(uniques),
+        'tags': tags
+    }
+
+def campaign_tag_level(tag_index, level):
+    """
+    Tag at one level of the campaign hierarchy (a CAMPAIGN_TAG_LEVELS name or
+    a position) for every row, as a categorical for grouping
+    """
+    position = CAMPAIGN_TAG_LEVELS.get(level, level)
+    values = [tags[position] if len(tags) > position else None for tags in tag_index['tags']]
+    values.append(None)  # linhas sem campanha (código -1)
+    value_codes, value_names = pd.factorize(np.array(values, dtype=object), sort=True)
+    return pd.Categorical.from_codes(value_codes[tag_index['codes']], categories=value_names)
+
+def get_tipo_campanha(tag_index):
+    """
+    Campaign type (Instituto or Ecommerce) of every row from its tags
+    """
+    tipos = [
+        next((CAMPAIGN_TIPO_TAGS[tag] for tag in tags if tag in CAMPAIGN_TIPO_TAGS), DEFAULT_TIPO_CAMPANHA)
+        for tags in tag_index['tags']
+    ]
+    tipos.append(DEFAULT_TIPO_CAMPANHA)  # linhas sem campanha (código -1)
+    tipo_codes, tipo_names = pd.factorize(np.array(tipos, dtype=object), sort=True)
+    return pd.Categorical.from_codes(tipo_codes[tag_index['codes']], categories=tipo_names)
+
+def compact_dataframe(df, category_columns=()):
+    """
+    Store low-cardinality columns as categoricals and downcast integer columns
+    Returns the compacted dataframe and the bytes saved per column
+    """
+    before = df.memory_usage(index=False, deep=True)
+    
+    for col in category_columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    
+    # Valores monetários continuam em float64 para não perder centavos nas somas
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    
+    after = df.memory_usage(index=False, deep=True)
+    saved = (before - after).rename('bytes_economizados')
+    for col, value in saved[saved != 0].items():
+        logger.info("Compactação de '%s': %d bytes economizados", col, value)
+    
+    return df, saved
+
+# Limite de células da chave combinada estado x categoria x dia no resumo;
+# acima dele cada dimensão é somada separadamente
+SUMMARY_MAX_CELLS = 1 << 22
+
+def _offset_codes(values):
+    """
+    Codes and labels of an integer or date column by offset from its minimum
+    (dates in whole days), without hashing; None when the column has other
+    types, times of day or a range much wider than its length
+    """
+    raw = values.to_numpy()
+    if not isinstance(values.dtype, np.dtype) or raw.dtype.kind not in 'iuM' or not len(raw):
+        return None
+    
+    if raw.dtype.kind == 'M':
+        missing = np.isnat(raw)
+        ticks = raw.view(np.int64)
+        if missing.any():
+            if missing.all():
+                return None
+            ticks = ticks[~missing]
+        step = int(np.timedelta64(1, 'D') / np.timedelta64(1, np.datetime_data(raw.dtype)[0]))
+    else:
+        missing = None
+        ticks = raw.astype(np.int64, copy=False)
+        step = 1
+    
+    first = ticks.min()
+    if step == 1:
+        offsets = ticks - first
+    else:
+        offsets, remainder = np.divmod(ticks - first, step)
+        if remainder.any():
+            return None
+    span = int(offsets.max()) + 1
+    if span > 2 * len(raw):
+        return None
+    
+    # Só os valores presentes viram rótulos; os códigos são renumerados
+    counts = np.bincount(offsets, minlength=span)
+    present = np.flatnonzero(counts)
+    if len(present) < span:
+        remap = np.full(span, -1, dtype=np.int64)
+        remap[present] = np.arange(len(present))
+        offsets = remap[offsets]
+    if missing is not None and missing.any():
+        codes = np.full(len(raw), -1, dtype=np.int64)
+        codes[~missing] = offsets
     else:
-        return 'Outros'
+        codes = offsets
+    
+    labels = first + present * step
+    labels = pd.Index(labels.view(raw.dtype) if raw.dtype.kind == 'M' else labels.astype(raw.dtype))
+    return codes, labels
+
+def _summary_codes(values):
+    """
+    Integer codes (missing values get the last code), number of labels and
+    the labels of a column, in the order groupby would list them
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy().astype(np.int64)
+        labels = values.cat.categories
+    else:
+        coded = _offset_codes(values)
+        codes, labels = coded if coded is not None else pd.factorize(values, sort=True)
+    n_labels = len(labels)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, n_labels, codes)
+    return codes, n_labels, labels
+
+def _sums_frame(values, sums, counts, n_labels, labels, columns):
+    """
+    Observed rows (at least one line) of per-code sums as a two-column frame
+    """
+    observed = np.flatnonzero(counts[:n_labels])
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        labels = pd.Categorical.from_codes(observed, dtype=values.dtype)
+    else:
+        labels = labels[observed]
+    return pd.DataFrame({columns[0]: labels, columns[1]: sums[observed]})
 
-def get_orders_summary(df_orders):
+def get_orders_summary(df_orders, order_counts=None):
     """
     Calculate summary statistics for orders
+    order_counts (from count_orders or estimate_orders) replaces the
+    distinct order counts computed from the lines
+    All groupings come from bincounts over integer codes: the sales by
+    state, category and day from one combined key when it fits in
+    SUMMARY_MAX_CELLS cells, the orders by status from one mark per
+    (status, order) pair
     """
-    total_pedidos = df_orders['pedido_id'].nunique()
-    total_vendas = df_orders['produto_valor_total'].sum()
+    valores = df_orders['produto_valor_total'].to_numpy()
+    
+    if order_counts is None:
+        order_codes, n_orders, _ = _summary_codes(df_orders['pedido_id'])
+        
+        # Status counts (pedidos distintos por status)
+        status = df_orders['pedido_status']
+        status_codes, n_status, status_labels = _summary_codes(status)
+        pairs = np.zeros((n_status + 1) * n_orders, dtype=bool)
+        pairs[status_codes * n_orders + order_codes] = True
+        pairs = pairs.reshape(n_status + 1, n_orders)
+        total_pedidos = int(pairs.any(axis=0).sum())
+        counts = pairs.sum(axis=1)
+        status_counts = _sums_frame(status, counts, counts, n_status, status_labels, ['Status', 'Contagem'])
+    else:
+        total_pedidos = order_counts['total_pedidos']
+        status_counts = order_counts['status_counts']
+    
+    total_vendas = valores.sum()
     ticket_medio = total_vendas / total_pedidos
     produtos_vendidos = df_orders['produto_quantidade'].sum()
     
+    # Vendas por estado, categoria e dia
+    dims = ['envio_estado', 'categoria_produto', 'pedido_data']
+    coded = [_summary_codes(df_orders[col]) for col in dims]
+    shape = tuple(n_labels + 1 for _, n_labels, _ in coded)
+    if np.prod(shape) <= SUMMARY_MAX_CELLS:
+        cells = np.ravel_multi_index([codes for codes, _, _ in coded], shape)
+        cell_sums = np.bincount(cells, weights=valores, minlength=np.prod(shape)).reshape(shape)
+        cell_counts = np.bincount(cells, minlength=np.prod(shape)).reshape(shape)
+        marginals = [
+            (cell_sums.sum(axis=other), cell_counts.sum(axis=other))
+            for other in [(1, 2), (0, 2), (0, 1)]
+        ]
+    else:
+        marginals = [
+            (np.bincount(codes, weights=valores, minlength=n_labels + 1), np.bincount(codes, minlength=n_labels + 1))
+            for codes, n_labels, _ in coded
+        ]
+    
+    vendas_por_estado, vendas_por_categoria, vendas_por_dia = [
+        _sums_frame(df_orders[col], sums, counts, n_labels, labels, [label, 'Valor Total'])
+        for col, (_, n_labels, labels), (sums, counts), label in zip(dims, coded, marginals, ['Estado', 'Categoria', 'Data'])
+    ]
+    
+    return {
+        'total_pedidos': total_pedidos,
+        'total_vendas': total_vendas,
+        'ticket_medio': ticket_medio,
+        'produtos_vendidos': produtos_vendidos,
+        'status_counts': status_counts,
+        'vendas_por_estado': vendas_por_estado,
+        'vendas_por_categoria': vendas_por_categoria,
+        'vendas_por_dia': vendas_por_dia
+    }
+
+# Grão do cubo de agregados: dia x estado x categoria x produto x tipo x status
+CUBE_DIMENSIONS = [
+    'pedido_data', 'envio_estado', 'categoria_produto', 'produto_nome',
+    'tipo_venda', 'pedido_status'
+]
+
+def build_orders_cube(df_orders, counted=None, known=None):
+    """
+    Pre-aggregate order lines at the CUBE_DIMENSIONS grain
+    Besides sales, quantity and line counts, each cell stores how many orders
+    start in it: 'pedidos' marks the first line of each order and
+    'pedidos_tipo' the first line of each order within its tipo_venda, so
+    summing them gives exact distinct order counts for any rollup filtered by
+    tipo_venda, date, state or status (data, estado and status are the same
+    on every line of an order)
+    counted holds (pedido_id, tipo_venda) pairs already counted elsewhere,
+    which are not marked again; known gives the same information per line,
+    as two masks (order already counted, pair already counted)
+    """
+    primeira = ~df_orders['pedido_id'].duplicated()
+    primeira_tipo = ~df_orders.duplicated(['pedido_id', 'tipo_venda'])
+    if known is not None:
+        primeira &= ~known[0]
+        primeira_tipo &= ~known[1]
+    if counted is not None and not counted.empty:
+        primeira &= ~df_orders['pedido_id'].isin(counted['pedido_id'])
+        pairs = pd.MultiIndex.from_frame(df_orders[['pedido_id', 'tipo_venda']].astype(object))
+        primeira_tipo &= ~pairs.isin(pd.MultiIndex.from_frame(counted.astype(object)))
+    
+    cube = df_orders[CUBE_DIMENSIONS + ['produto_valor_total', 'produto_quantidade']].assign(
+        pedidos=primeira.astype('int32'),
+        pedidos_tipo=primeira_tipo.astype('int32'),
+        linhas=np.int32(1)
+    )
+    
+    return cube.groupby(CUBE_DIMENSIONS, observed=True, sort=False).sum().reset_index()
+
+def merge_cubes(cubes):
+    """
+    Combine cubes into one, summing the cells they have in common
+    """
+    cube = concat_frames(cubes)
+    return cube.groupby(CUBE_DIMENSIONS, observed=True, sort=False).sum().reset_index()
+
+def counted_orders(df_new, df_previous, high_water_mark=None):
+    """
+    (pedido_id, tipo_venda) pairs of df_previous continued by new order
+    lines, already counted in the cube built from df_previous (None if none)
+    Only lines below the previous high-water mark can belong to a known
+    order (e.g. the rest of an order split by the append), so df_previous is
+    only searched for those
+    """
+    if high_water_mark is None:
+        high_water_mark = get_high_water_mark(df_previous)
+    known_ids = df_new.loc[below_high_water_mark(df_new, high_water_mark), 'pedido_id'].unique()
+    if not len(known_ids):
+        return None
+    return df_previous.loc[
+        df_previous['pedido_id'].isin(known_ids), ['pedido_id', 'tipo_venda']
+    ].drop_duplicates()
+
+def update_orders_cube(cube, df_new, df_previous, high_water_mark=None):
+    """
+    Fold new order lines into the cube built from df_previous, without
+    counting again orders that were already there
+    """
+    counted = counted_orders(df_new, df_previous, high_water_mark)
+    return merge_cubes([cube, build_orders_cube(df_new, counted)])
+
+def rollup_cube(cube, by, columns=('produto_valor_total',), **filters):
+    """
+    Aggregate the cube cells matching the filters (column=value) by the
+    given dimensions
+    """
+    cells = cube
+    if filters:
+        mask = np.ones(len(cube), dtype=bool)
+        for col, value in filters.items():
+            mask &= (cube[col] == value).to_numpy()
+        cells = cube[mask]
+    
+    return cells.groupby(by, observed=True)[list(columns)].sum().reset_index()
+
+def get_cube_summary(cube, tipo_venda=None):
+    """
+    Calculate the get_orders_summary statistics from the orders cube,
+    optionally restricted to one tipo_venda
+    """
+    filters = {} if tipo_venda is None else {'tipo_venda': tipo_venda}
+    pedidos = 'pedidos' if tipo_venda is None else 'pedidos_tipo'
+    
+    totals = rollup_cube(cube, 'tipo_venda', ['produto_valor_total', 'produto_quantidade', pedidos], **filters)
+    total_pedidos = totals[pedidos].sum()
+    total_vendas = totals['produto_valor_total'].sum()
+    ticket_medio = total_vendas / total_pedidos
+    produtos_vendidos = totals['produto_quantidade'].sum()
+    
     # Status counts
-    status_counts = df_orders.groupby('pedido_status')['pedido_id'].nunique().reset_index()
+    status_counts = rollup_cube(cube, 'pedido_status', [pedidos], **filters)
     status_counts.columns = ['Status', 'Contagem']
     
     # Vendas por estado
-    vendas_por_estado = df_orders.groupby('envio_estado')['produto_valor_total'].sum().reset_index()
+    vendas_por_estado = rollup_cube(cube, 'envio_estado', **filters)
     vendas_por_estado.columns = ['Estado', 'Valor Total']
     
     # Vendas por categoria
-    vendas_por_categoria = df_orders.groupby('categoria_produto')['produto_valor_total'].sum().reset_index()
+    vendas_por_categoria = rollup_cube(cube, 'categoria_produto', **filters)
     vendas_por_categoria.columns = ['Categoria', 'Valor Total']
     
     # Vendas por dia
-    vendas_por_dia = df_orders.groupby('pedido_data')['produto_valor_total'].sum().reset_index()
+    vendas_por_dia = rollup_cube(cube, 'pedido_data', **filters)
     vendas_por_dia.columns = ['Data', 'Valor Total']
     
     return {
@@ -154,43 +1376,705 @@ def get_orders_summary(df_orders):
         'vendas_por_dia': vendas_por_dia
     }
 
-def get_ads_summary(df_ads):
+def build_weekday_hour_matrix(df_orders, by='categoria_produto'):
+    """
+    Sales value by weekday (0 = Monday) x hour, as a 7 x 24 matrix, plus one
+    matrix per value of the by column, in a single bincount pass
+    """
+    groups = df_orders[by].astype('category')
+    n_groups = len(groups.cat.categories)
+    dias = df_orders['dia_semana'].to_numpy().astype(np.int64)
+    horas = df_orders['hora'].to_numpy().astype(np.int64)
+    codes = groups.cat.codes.to_numpy().astype(np.int64)
+    valid = (dias >= 0) & (horas >= 0) & (codes >= 0)
+    
+    cells = (codes * 7 + dias) * 24 + horas
+    by_group = np.bincount(
+        cells[valid], weights=df_orders['produto_valor_total'].to_numpy()[valid],
+        minlength=n_groups * 7 * 24
+    ).reshape(n_groups, 7, 24)
+    
+    return {
+        'total': by_group.sum(axis=0),
+        'groups': groups.cat.categories.tolist(),
+        'by_group': by_group
+    }
+
+def weekday_hour_totals(matrix, by):
+    """
+    Sales by weekday ('dia_semana') or by hour ('hora') as the row or column
+    sums of a build_weekday_hour_matrix result, for the values with sales
+    """
+    totals = matrix['total'].sum(axis=1 if by == 'dia_semana' else 0)
+    values = np.flatnonzero(totals)
+    return pd.DataFrame({by: values, 'produto_valor_total': totals[values]})
+
+# Métricas derivadas das campanhas: nome -> (numerador, denominador, fator)
+ADS_KPIS = {
+    'ctr': ('cliques', 'impressoes', 100),
+    'cpc': ('valor_gasto', 'cliques', 1),
+    'cpm': ('valor_gasto', 'impressoes', 1000),
+    'cpa': ('valor_gasto', 'adicoes_carrinho', 1),
+    'taxa_conversao': ('adicoes_carrinho', 'cliques', 100),
+    'custo_view_pagina': ('valor_gasto', 'views_pagina', 1),
+    'roas': ('receita', 'valor_gasto', 1)
+}
+ADS_MEASURES = [
+    'alcance', 'impressoes', 'cliques', 'views_pagina', 'adicoes_carrinho',
+    'valor_conversao_carrinho', 'valor_gasto'
+]
+
+def safe_divide(numerator, denominator, default=0.0):
+    """
+    Element-wise numerator / denominator, with default where the denominator
+    is zero (scalars in, scalar out)
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    result = np.full(np.broadcast(numerator, denominator).shape, default, dtype=np.float64)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result if result.ndim else float(result)
+
+def ads_kpis(totals, receita=None):
+    """
+    All derived campaign KPIs (ADS_KPIS plus roi, in %) from summed ads
+    measures (a DataFrame, Series or dict). receita defaults to the cart
+    conversion value; pass the sales total to measure against real revenue
+    """
+    values = dict(totals)
+    values['receita'] = values['valor_conversao_carrinho'] if receita is None else receita
+    
+    kpis = {
+        name: safe_divide(values[num], values[den]) * factor
+        for name, (num, den, factor) in ADS_KPIS.items()
+    }
+    kpis['roi'] = np.where(np.asarray(values['valor_gasto']) != 0, (kpis['roas'] - 1) * 100, 0.0)
+    if np.ndim(kpis['roi']) == 0:
+        kpis['roi'] = float(kpis['roi'])
+    return kpis
+
+def get_ads_kpis(df_ads, by):
+    """
+    Summed ads measures and their KPIs for each value of the by column(s)
+    """
+    totals = df_ads.groupby(by, observed=True)[ADS_MEASURES].sum().reset_index()
+    return totals.assign(**ads_kpis(totals))
+
+def get_ads_summary(df_ads, receita=None):
     """
     Calculate summary statistics for ad campaigns
+    receita (sales total) is used for roi and roas; defaults to the cart
+    conversion value
     """
-    total_gasto = df_ads['valor_gasto'].sum()
-    total_impressoes = df_ads['impressoes'].sum()
-    total_cliques = df_ads['cliques'].sum()
-    total_conversoes = df_ads['adicoes_carrinho'].sum()
+    totals = {col: df_ads[col].sum() for col in ADS_MEASURES}
+    kpis = ads_kpis(totals, receita)
     
-    ctr = (total_cliques / total_impressoes) * 100 if total_impressoes > 0 else 0
-    taxa_conversao = (total_conversoes / total_cliques) * 100 if total_cliques > 0 else 0
     cpm_medio = df_ads['cpm'].mean()
     cpc_medio = df_ads['cpc'].mean()
     
     # Gasto por tipo de campanha
-    gasto_por_tipo = df_ads.groupby('tipo_campanha')['valor_gasto'].sum().reset_index()
+    gasto_por_tipo = df_ads.groupby('tipo_campanha', observed=True)['valor_gasto'].sum().reset_index()
     gasto_por_tipo.columns = ['Tipo', 'Valor Gasto']
     
     # Conversões por tipo de campanha
-    conv_por_tipo = df_ads.groupby('tipo_campanha')['adicoes_carrinho'].sum().reset_index()
+    conv_por_tipo = df_ads.groupby('tipo_campanha', observed=True)['adicoes_carrinho'].sum().reset_index()
     conv_por_tipo.columns = ['Tipo', 'Conversões']
     
     return {
-        'total_gasto': total_gasto,
-        'total_impressoes': total_impressoes,
-        'total_cliques': total_cliques,
-        'total_conversoes': total_conversoes,
-        'ctr': ctr,
-        'taxa_conversao': taxa_conversao,
+        'total_gasto': totals['valor_gasto'],
+        'total_impressoes': totals['impressoes'],
+        'total_cliques': totals['cliques'],
+        'total_conversoes': totals['adicoes_carrinho'],
+        'ctr': kpis['ctr'],
+        'taxa_conversao': kpis['taxa_conversao'],
+        'cpa': kpis['cpa'],
+        'roas': kpis['roas'],
+        'roi': kpis['roi'],
         'cpm_medio': cpm_medio,
         'cpc_medio': cpc_medio,
         'gasto_por_tipo': gasto_por_tipo,
         'conv_por_tipo': conv_por_tipo
     }
 
-def filter_dataframe(df, column, value):
+def build_ads_daily(df_ads):
+    """
+    Time-bucketed index of the ad reporting periods: one row per ad row and
+    day between data_inicio and data_fim, with the spend spread evenly over
+    the days (daily exports give one row each)
+    """
+    inicio = df_ads['data_inicio'].dt.normalize().to_numpy()
+    fim = df_ads['data_fim'].dt.normalize().to_numpy()
+    n_days = ((fim - inicio) // np.timedelta64(1, 'D')).astype(np.int64) + 1
+    n_days = np.maximum(n_days, 1)
+    
+    rows = np.repeat(np.arange(len(df_ads)), n_days)
+    # Deslocamento de cada dia dentro do seu período (0, 1, 2...)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(n_days) - n_days, n_days)
+    
+    return pd.DataFrame({
+        'data': inicio[rows] + offsets * np.timedelta64(1, 'D'),
+        'tipo_venda': df_ads['tipo_campanha'].to_numpy()[rows],
+        'nome_campanha': df_ads['nome_campanha'].to_numpy()[rows],
+        'valor_gasto': df_ads['valor_gasto'].to_numpy()[rows] / n_days[rows]
+    })
+
+def attribute_sales(daily_sales, ads_daily):
+    """
+    Attribute the daily sales of each tipo_venda to the campaigns of the same
+    type active on that day, in proportion to their spend on the day
+    daily_sales has pedido_data, tipo_venda and produto_valor_total (e.g. a
+    rollup of the orders cube); the join is a hash merge on (day, type)
+    """
+    sales = daily_sales.rename(columns={'pedido_data': 'data', 'produto_valor_total': 'vendas_dia'})
+    sales = sales.astype({'tipo_venda': str})
+    attribution = ads_daily.astype({'tipo_venda': str}).merge(sales, on=['data', 'tipo_venda'], how='left')
+    attribution['vendas_dia'] = attribution['vendas_dia'].fillna(0.0)
+    
+    gasto_dia = attribution.groupby(['data', 'tipo_venda'])['valor_gasto'].transform('sum')
+    attribution['vendas_atribuidas'] = safe_divide(attribution['valor_gasto'], gasto_dia) * attribution['vendas_dia']
+    return attribution.drop(columns='vendas_dia')
+
+def get_attribution_roi(attribution, by):
+    """
+    Spend, attributed sales, ROAS and ROI (%) by the given column(s)
+    (e.g. 'data' or 'nome_campanha')
+    """
+    totals = attribution.groupby(by, observed=True)[['valor_gasto', 'vendas_atribuidas']].sum().reset_index()
+    totals['roas'] = safe_divide(totals['vendas_atribuidas'], totals['valor_gasto'])
+    totals['roi'] = np.where(totals['valor_gasto'] != 0, (totals['roas'] - 1) * 100, 0.0)
+    return totals
+
+# Colunas com índice de filtros (bitmap por valor)
+FILTER_COLUMNS = ['tipo_venda', 'pedido_status', 'envio_estado', 'categoria_produto']
+
+def build_filter_index(df, columns=FILTER_COLUMNS):
+    """
+    Precompute, for each value of the filter columns, a packed bitmap of the
+    rows holding that value
+    """
+    index = {'n_rows': len(df), 'bitmaps': {}}
+    
+    for col in columns:
+        codes, uniques = pd.factorize(df[col])
+        index['bitmaps'][col] = {
+            value: np.packbits(codes == code) for code, value in enumerate(uniques)
+        }
+    
+    return index
+
+def filter_rows(index, **filters):
+    """
+    Positions of the rows matching every filter (column=value), combining
+    the bitmaps with a bitwise AND
+    Returns None when no filter is given
+    """
+    combined = None
+    for col, value in filters.items():
+        bitmap = index['bitmaps'][col].get(value)
+        if bitmap is None:
+            return np.empty(0, dtype=np.intp)
+        combined = bitmap if combined is None else combined & bitmap
+    
+    if combined is None:
+        return None
+    return np.flatnonzero(np.unpackbits(combined, count=index['n_rows']))
+
+# Contagem de pedidos distintos: exata (tabela de pedidos) ou aproximada
+# (sketches HyperLogLog), escolhida por DASHBOARD_DISTINCT_MODE
+DISTINCT_MODE = os.environ.get('DASHBOARD_DISTINCT_MODE', 'exact')
+HLL_PRECISION = 10
+
+def _status_counts(status, mask=None):
+    """
+    Status x count table, in category order, from one status per order
+    """
+    codes = status.cat.codes.to_numpy()
+    if mask is not None:
+        codes = codes[mask]
+    counts = np.bincount(codes[codes >= 0], minlength=len(status.cat.categories))
+    observed = np.flatnonzero(counts)
+    return pd.DataFrame({
+        'Status': pd.Categorical.from_codes(observed, dtype=status.dtype),
+        'Contagem': counts[observed]
+    })
+
+# Filtros que valem para o pedido inteiro: todas as linhas de um pedido têm o
+# mesmo status e estado. Categoria, tipo e palavra-chave selecionam linhas
+ORDER_FILTER_COLUMNS = ['pedido_status', 'envio_estado']
+
+def build_orders_table(df_orders):
+    """
+    Order header fact table: one row per order with the fields repeated on
+    its lines (id, date, hour, weekday, timestamp, status, state), its total
+    value, number of lines and quantity. line_order links every line to its
+    order row, so distinct order counts become row counts
+    """
+    line_order, _ = pd.factorize(df_orders['pedido_id'], sort=False)
+    line_order = line_order.astype(np.int32)
+    # Códigos seguem a ordem da primeira ocorrência de cada pedido
+    first_lines = np.flatnonzero(~df_orders['pedido_id'].duplicated().to_numpy())
+    orders = df_orders.iloc[first_lines][
+        ['pedido_id', 'pedido_data', 'hora', 'dia_semana', 'pedido_timestamp', 'pedido_status', 'envio_estado']
+    ].reset_index(drop=True)
+    
+    n_orders = len(orders)
+    orders['valor_total'] = np.bincount(
+        line_order, weights=df_orders['produto_valor_total'].to_numpy(), minlength=n_orders
+    )
+    orders['itens'] = np.bincount(line_order, minlength=n_orders).astype(np.int32)
+    orders['quantidade'] = np.bincount(
+        line_order, weights=df_orders['produto_quantidade'].to_numpy(), minlength=n_orders
+    ).astype(np.int32)
+    
+    return {'line_order': line_order, 'orders': orders}
+
+def _selected_orders(orders_table, rows):
+    """
+    Mask of the orders with at least one line at the given positions
+    """
+    selected = np.zeros(len(orders_table['orders']), dtype=bool)
+    selected[orders_table['line_order'][rows]] = True
+    return selected
+
+def count_orders(orders_table, rows=None):
+    """
+    Exact number of distinct orders (total and by status) among the lines
+    at the given positions (None = all lines)
+    """
+    orders = orders_table['orders']
+    if rows is None:
+        return {
+            'total_pedidos': len(orders),
+            'status_counts': _status_counts(orders['pedido_status'])
+        }
+    
+    selected = _selected_orders(orders_table, rows)
+    return {
+        'total_pedidos': int(selected.sum()),
+        'status_counts': _status_counts(orders['pedido_status'], selected)
+    }
+
+def count_orders_by(orders_table, by, rows=None):
+    """
+    Exact number of distinct orders ('pedidos') for each value of an order
+    column (date, hour, weekday, status or state) among the lines at the
+    given positions (None = all lines)
+    """
+    orders = orders_table['orders']
+    if rows is not None:
+        orders = orders[_selected_orders(orders_table, rows)]
+    return orders.groupby(by, observed=True).size().rename('pedidos').reset_index()
+
+def sum_orders_by(orders_table, by, rows=None):
+    """
+    Distinct orders ('pedidos') and their total value ('produto_valor_total')
+    for each value of an order column, from the per-order measures
+    Only valid when the lines were selected by ORDER_FILTER_COLUMNS: with a
+    line filter, the order totals would include lines filtered out
+    """
+    orders = orders_table['orders']
+    if rows is not None:
+        orders = orders[_selected_orders(orders_table, rows)]
+    return orders.groupby(by, observed=True).agg(
+        produto_valor_total=('valor_total', 'sum'), pedidos=('valor_total', 'size')
+    ).reset_index()
+
+def summarize_orders(orders_table, rows=None):
+    """
+    The get_orders_summary totals (orders, sales, average ticket, products
+    sold and orders by status) from the per-order measures, for the orders
+    with a line at the given positions (None = all orders)
+    Only valid when the lines were selected by ORDER_FILTER_COLUMNS
+    """
+    orders = orders_table['orders']
+    selected = None if rows is None else _selected_orders(orders_table, rows)
+    status_counts = _status_counts(orders['pedido_status'], selected)
+    if selected is not None:
+        orders = orders[selected]
+    
+    total_pedidos = len(orders)
+    total_vendas = orders['valor_total'].sum()
+    return {
+        'total_pedidos': total_pedidos,
+        'total_vendas': total_vendas,
+        'ticket_medio': safe_divide(total_vendas, total_pedidos),
+        'produtos_vendidos': orders['quantidade'].sum(),
+        'status_counts': status_counts
+    }
+
+def hash_ids(values):
+    """
+    64-bit hash (splitmix64) of integer ids
+    """
+    h = np.asarray(values, dtype=np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+def hll_registers(ids, groups, n_groups, precision=HLL_PRECISION):
+    """
+    HyperLogLog registers (n_groups x 2^precision) of the ids in each group
+    """
+    m = 1 << precision
+    h = hash_ids(ids)
+    bucket = (h >> np.uint64(64 - precision)).astype(np.int64)
+    # Posição do primeiro bit 1 nos 32 bits baixos (frexp é exato para 32 bits)
+    low = (h & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    rank = (33 - np.frexp(low)[1]).astype(np.uint8)
+    
+    registers = np.zeros(n_groups * m, dtype=np.uint8)
+    np.maximum.at(registers, np.asarray(groups, dtype=np.int64) * m + bucket, rank)
+    return registers.reshape(n_groups, m)
+
+def hll_estimate(registers):
+    """
+    Cardinality estimate of one set of HyperLogLog registers
+    """
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)
+    return estimate
+
+def build_orders_sketches(df_orders, columns=FILTER_COLUMNS, precision=HLL_PRECISION):
+    """
+    One HyperLogLog sketch of pedido_id per combination of the filter
+    columns (and status); sketches are merged with a max, so any filter
+    combination is estimated from the union of its cells
+    """
+    dims = list(dict.fromkeys(list(columns) + ['pedido_status']))
+    grouped = df_orders.groupby(dims, observed=True, sort=False)
+    cells = grouped.size().reset_index()[dims]
+    registers = hll_registers(df_orders['pedido_id'].to_numpy(), grouped.ngroup().to_numpy(), len(cells), precision)
+    return {'cells': cells, 'registers': registers}
+
+def estimate_orders(sketches, **filters):
+    """
+    Approximate number of distinct orders (total and by status) matching the
+    filters (column=value), from the HyperLogLog sketches
+    """
+    cells = sketches['cells']
+    mask = np.ones(len(cells), dtype=bool)
+    for col, value in filters.items():
+        mask &= (cells[col] == value).to_numpy()
+    
+    if not mask.any():
+        return {'total_pedidos': 0, 'status_counts': _status_counts(cells['pedido_status'].iloc[:0])}
+    
+    status = cells['pedido_status']
+    codes = status.cat.codes.to_numpy()
+    observed = np.unique(codes[mask])
+    counts = [
+        int(round(hll_estimate(sketches['registers'][mask & (codes == code)].max(axis=0))))
+        for code in observed
+    ]
+    return {
+        'total_pedidos': int(round(hll_estimate(sketches['registers'][mask].max(axis=0)))),
+        'status_counts': pd.DataFrame({
+            'Status': pd.Categorical.from_codes(observed, dtype=status.dtype),
+            'Contagem': counts
+        })
+    }
+
+def normalize_text(text):
+    """
+    Lowercase text and strip accents (Xícara -> xicara)
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text).lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+def build_search_index(names):
+    """
+    Accent-insensitive index over the distinct product names
+    Every suffix of every token points to the names containing it, so any
+    piece of a word is found by a prefix lookup; each name keeps the
+    positions of its rows
+    """
+    codes, uniques = pd.factorize(names)
+    normalized = [normalize_text(name) for name in uniques]
+    
+    postings = {}
+    for code, name in enumerate(normalized):
+        for token in re.findall(r'\w+', name):
+            for start in range(len(token)):
+                postings.setdefault(token[start:], set()).add(code)
+    keys = sorted(postings)
+    
+    # Linhas de cada nome: posições ordenadas pelo código do nome
+    order = np.argsort(codes, kind='stable')
+    offsets = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    
+    return {
+        'names': normalized,
+        'keys': keys,
+        'postings': [postings[key] for key in keys],
+        'rows': order,
+        'offsets': offsets
+    }
+
+def search_rows(index, query):
+    """
+    Positions of the rows whose product name contains the query, ignoring
+    case and accents (same matches as a literal substring search)
+    Spaces are part of the query (" kit " does not match "Kitchen")
+    Returns None for an empty query
+    """
+    query = normalize_text(query)
+    if not query:
+        return None
+    
+    candidates = None
+    for term in re.findall(r'\w+', query):
+        lo = bisect_left(index['keys'], term)
+        hi = bisect_left(index['keys'], term + '\uffff')
+        matches = set().union(*index['postings'][lo:hi])
+        candidates = matches if candidates is None else candidates & matches
+        if not candidates:
+            return np.empty(0, dtype=np.intp)
+    
+    if candidates is None:
+        # Consulta sem letras ou números (ex.: "|"): verificar todos os nomes
+        candidates = range(len(index['names']))
+    
+    # Confirmar o trecho completo (com espaços e pontuação) nos candidatos
+    codes = [code for code in candidates if query in index['names'][code]]
+    if not codes:
+        return np.empty(0, dtype=np.intp)
+    
+    rows = np.concatenate([
+        index['rows'][index['offsets'][code]:index['offsets'][code + 1]] for code in codes
+    ])
+    rows.sort()
+    return rows
+
+def build_sort_index(df, column='pedido_data', ascending=False):
+    """
+    Stable row order of the dataframe by one column, computed once so the
+    table never has to sort on a rerun; missing values come last in either
+    direction
+    """
+    keys, uniques = pd.factorize(df[column], sort=True)
+    if not ascending:
+        keys = len(uniques) - 1 - keys
+    # Ausentes (código -1) depois de todos os valores
+    keys[df[column].isna().to_numpy()] = len(uniques)
+    return np.argsort(keys, kind='stable')
+
+def sorted_page(sort_index, rows, page, page_size):
+    """
+    Positions of the rows shown on one page of the sorted table, restricted
+    to the filtered rows (None = all rows)
+    Returns the page positions and the total number of rows
+    """
+    if rows is None:
+        ordered = sort_index
+    else:
+        selected = np.zeros(len(sort_index), dtype=bool)
+        selected[rows] = True
+        ordered = sort_index[selected[sort_index]]
+    
+    start = max(page - 1, 0) * page_size
+    return ordered[start:start + page_size], len(ordered)
+
+def filter_dataframe(df, column, value, index=None):
     """
     Filter dataframe based on a column value
+    Uses the filter index built by build_filter_index when one is given
     """
+    if index is not None and column in index['bitmaps']:
+        return df.take(filter_rows(index, **{column: value}))
     return df[df[column] == value]
+
+class MemoryCacheBackend:
+    """
+    In-process LRU of serialized results with TTL and a size limit
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, payload = entry
+            if expires < time.time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return payload
+    
+    def set(self, key, payload, ttl, version=None):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if len(payload) > self.max_bytes:
+                return
+            self.entries[key] = (time.time() + ttl, payload)
+            self.size += len(payload)
+            # Descarta os menos usados até caber no limite
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+    
+    def _remove(self, key):
+        _, payload = self.entries.pop(key)
+        self.size -= len(payload)
+
+class DiskCacheBackend:
+    """
+    Serialized results in files shared by every worker on the machine, read
+    through memory-map; expired by modification time, oldest removed first
+    when the directory exceeds the size limit
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+    
+    def get(self, key):
+        path = os.path.join(self.directory, f"{key}.bin")
+        try:
+            with open(path, 'rb') as f:
+                expires = float(f.readline())
+                if expires < time.time():
+                    return None
+                offset = f.tell()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return mapped[offset:]
+        except (OSError, ValueError):
+            return None
+    
+    def set(self, key, payload, ttl, version=None):
+        path = os.path.join(self.directory, f"{key}.bin")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                f.write(f"{time.time() + ttl}\n".encode())
+                f.write(payload)
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError:
+            # Sistema de arquivos somente leitura: seguir sem cache
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+class RedisCacheBackend:
+    """
+    Serialized results in Redis (or any client with the same commands).
+    The keys written for each data version are kept in a set and the
+    versions in a sorted set by first write; a write for a new version
+    deletes the keys of all but the last max_versions versions, so the
+    server holds the current results only, whatever its maxmemory policy
+    """
+    def __init__(self, client, prefix='dashboard:', max_versions=2):
+        self.client = client
+        self.prefix = prefix
+        self.max_versions = max_versions
+    
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+    
+    def set(self, key, payload, ttl, version=None):
+        self.client.set(self.prefix + key, payload, ex=ttl)
+        if version is None:
+            return
+        
+        versions = self.prefix + 'versions'
+        version_keys = f"{self.prefix}keys:{version}"
+        self.client.sadd(version_keys, self.prefix + key)
+        self.client.expire(version_keys, ttl)
+        if not self.client.zadd(versions, {version: time.time()}, nx=True):
+            return
+        # Nova versão: descartar os resultados das versões antigas
+        for old in self.client.zrange(versions, 0, -self.max_versions - 1):
+            old = old.decode() if isinstance(old, bytes) else old
+            old_keys = f"{self.prefix}keys:{old}"
+            keys = self.client.smembers(old_keys)
+            if keys:
+                self.client.delete(*keys)
+            self.client.delete(old_keys)
+            self.client.zrem(versions, old)
+
+def create_cache_backend(spec=SHARED_CACHE, max_mb=SHARED_CACHE_MAX_MB):
+    """
+    Cache backend from its DASHBOARD_SHARED_CACHE specification (None = off)
+    """
+    max_bytes = max_mb * 1024 * 1024
+    if spec in ('', 'off'):
+        return None
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is None:
+            logger.warning("Pacote redis não instalado; usando cache em memória")
+            return MemoryCacheBackend(max_bytes)
+        return RedisCacheBackend(redis.Redis.from_url(spec))
+    if spec == 'disk':
+        return DiskCacheBackend(os.path.join(CACHE_DIR, 'shared'), max_bytes)
+    return MemoryCacheBackend(max_bytes)
+
+_shared_cache = []
+
+def get_shared_cache():
+    """
+    Process-wide shared cache backend, created on first use (None = off)
+    """
+    if not _shared_cache:
+        _shared_cache.append(create_cache_backend())
+    return _shared_cache[0]
+
+def shared_cache_key(namespace, data_version, params=()):
+    """
+    Cache key from the data version and the parameters of a result
+    """
+    raw = repr((CACHE_VERSION, namespace, data_version, params)).encode()
+    return f"{namespace}-{hashlib.sha1(raw).hexdigest()}"
+
+def shared_result(namespace, data_version, params, build, ttl=SHARED_CACHE_TTL, backend=None):
+    """
+    Result of build() shared between workers through the cache backend:
+    computed by the first worker that needs it and read by the others
+    Meant for small derived results (summaries, aggregates, figure specs);
+    every read unpickles a full copy
+    """
+    backend = get_shared_cache() if backend is None else backend
+    if backend is None:
+        return build()
+    key = shared_cache_key(namespace, data_version, params)
+    
+    try:
+        payload = backend.get(key)
+    except Exception:  # backend remoto indisponível: calcular localmente
+        logger.warning("Falha ao ler o cache compartilhado", exc_info=True)
+        payload = None
+    if payload is not None:
+        try:
+            return pickle.loads(payload)
+        except Exception:
+            logger.warning("Entrada inválida no cache compartilhado: %s", key)
+    
+    result = build()
+    try:
+        backend.set(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), ttl, data_version)
+    except Exception:
+        logger.warning("Falha ao gravar no cache compartilhado", exc_info=True)
+    return result